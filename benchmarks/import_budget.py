@@ -0,0 +1,70 @@
+"""
+Import-time budget for the headless analysis path.
+
+Imports the parsing, analysis and logging modules in a fresh interpreter and
+fails if any UI or plotting package gets pulled in, or if the import takes
+longer than the budget (best of several runs).
+
+Usage: python benchmarks/import_budget.py [--budget SECONDS] [--runs N]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+HEADLESS_MODULES = [
+    'parser.csv_parser',
+    'parser.sample_cache',
+    'parser.formats',
+    'utils.stats_utils',
+    'utils.metrics',
+    'model.storage',
+    'model.logger',
+    'model.data_importer',
+    'model.prompt_builder',
+]
+FORBIDDEN_MODULES = ['streamlit', 'matplotlib', 'seaborn', 'tkinter', 'requests']
+DEFAULT_BUDGET_SECONDS = 1.5
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PROBE = '''
+import json, sys, time
+start = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+elapsed = time.perf_counter() - start
+loaded = sorted({{m.split('.')[0] for m in sys.modules}} & set({forbidden!r}))
+print(json.dumps({{"seconds": elapsed, "forbidden": loaded}}))
+'''
+
+def measure_import():
+    probe = PROBE.format(modules=HEADLESS_MODULES, forbidden=FORBIDDEN_MODULES)
+    output = subprocess.run([sys.executable, '-c', probe], cwd=REPO_ROOT,
+                            capture_output=True, text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--budget', type=float, default=DEFAULT_BUDGET_SECONDS,
+                            help=f'Maximum import time in seconds (default {DEFAULT_BUDGET_SECONDS})')
+    arg_parser.add_argument('--runs', type=int, default=3)
+    args = arg_parser.parse_args()
+
+    results = [measure_import() for _ in range(args.runs)]
+    best = min(result['seconds'] for result in results)
+    forbidden = sorted({name for result in results for name in result['forbidden']})
+
+    print(f"Headless import: {best * 1000:.0f} ms (best of {args.runs}, budget {args.budget * 1000:.0f} ms)")
+    failed = False
+    if forbidden:
+        print(f"FAIL: headless path imported {', '.join(forbidden)}")
+        failed = True
+    if best > args.budget:
+        print("FAIL: import time over budget")
+        failed = True
+    return 1 if failed else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,196 @@
+"""
+Benchmark harness for the upload path.
+
+Generates synthetic HealthFit exports (see synthetic.py) and times and
+memory-profiles parse_csv_file, analyze_workout_data, log_workout,
+fetch_workout_log, the paginated log view and every visualisation function. Results are written as
+JSON; pass --baseline to compare a run against an earlier one.
+
+Usage: python benchmarks/run_benchmarks.py [--minutes 10 60 360 1440] [--output results.json]
+                                           [--baseline baseline.json] [--tolerance 0.2]
+"""
+import argparse
+import gc
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import date, timedelta
+from types import SimpleNamespace
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, REPO_ROOT)
+
+from streamlit.logger import set_log_level  # noqa: E402
+from synthetic import write_export, export_name  # noqa: E402
+from utils.timing import set_metrics_path  # noqa: E402
+from parser.csv_parser import parse_csv_file, read_samples  # noqa: E402
+from utils.stats_utils import analyze_workout_data  # noqa: E402
+from model.logger import (log_workout, log_workouts, workout_row, fetch_workout_log,  # noqa: E402
+                          fetch_workout_page, fetch_workout_count, fetch_rollup, fetch_workout_type_counts)
+from visualisations.aggregate import aggregate_history  # noqa: E402
+from visualisations.calendar import plot_workout_by_weekday_heatmap, plot_calendar_month_heatmap  # noqa: E402
+from visualisations.charts import plot_monthly_workout_volume, plot_workout_type_distribution  # noqa: E402
+
+DEFAULT_MINUTES = [10, 60, 360, 1440]
+DEFAULT_HISTORY = 1000  # Workouts in the log used for the database and chart benchmarks
+PROFILE = ('male', 75, 178, 35)  # gender, weight, height, age
+WORKOUT_TYPES = ['Outdoor Run', 'Outdoor Cycling', 'Indoor Walk', 'Yoga', 'Hiking']
+
+
+def measure(fn, repeat):
+    """
+    Returns the best wall time over `repeat` calls and the peak traced allocation of one more call.
+    Memory is traced in a separate call because tracemalloc slows the code it watches.
+    """
+    times = []
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    try:
+        fn()
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'peak_bytes': peak}
+
+def fill_history(db_path, workouts):
+    """
+    Logs `workouts` synthetic sessions spread over the last few years.
+    """
+    rows = []
+    for i in range(workouts):
+        day = date(2022, 1, 1) + timedelta(days=i * 3 % 1095)
+        stats = {'total_distance': 5000 + i % 7 * 1000, 'workout_duration': 30 + i % 60, 'avg_heart_rate': 140}
+        rows.append(workout_row(f"{day}-history-{i}.csv", stats, WORKOUT_TYPES[i % len(WORKOUT_TYPES)], f"history-{i}"))
+    log_workouts(rows, db_path)
+
+def run(minutes_list, missing_share, history, repeat, work_dir):
+    results = {}
+    db_path = os.path.join(work_dir, 'workout_log.db')
+    fill_history(db_path, history)
+
+    for minutes in minutes_list:
+        path = os.path.join(work_dir, export_name(minutes))
+        rows = write_export(path, minutes, missing_share=missing_share)
+        samples = read_samples(path, use_cache=False)
+        stats = analyze_workout_data(samples, *PROFILE)
+        upload = SimpleNamespace(name=os.path.basename(path))
+
+        cases = {
+            'parse_csv_file': lambda: parse_csv_file(path, use_cache=False),
+            'read_samples': lambda: read_samples(path, use_cache=False),
+            'analyze_workout_data': lambda: analyze_workout_data(samples, *PROFILE),
+            'log_workout': lambda: log_workout(upload, stats, 'Outdoor Run', f"bench-{minutes}", db_path),
+        }
+        for name, fn in cases.items():
+            results[f"{name}[{minutes:g}min]"] = dict(measure(fn, repeat), rows=rows)
+            print(f"  {name}[{minutes:g}min]: {results[f'{name}[{minutes:g}min]']['seconds'] * 1000:.1f} ms")
+
+    history_cases = {
+        'fetch_workout_log': lambda: fetch_workout_log(db_path),
+        'fetch_workout_page': lambda: fetch_workout_page(db_path=db_path),
+        # A page deep in the history, reached through its keyset cursor
+        'fetch_workout_page[deep]': lambda: fetch_workout_page(after=('2022-06-01', 0), db_path=db_path),
+        'fetch_workout_count': lambda: fetch_workout_count('2022-01-01', '2023-12-31', WORKOUT_TYPES[:2], db_path),
+        'aggregate_history': lambda: aggregate_history(fetch_rollup('day', db_path)),
+    }
+    daily = aggregate_history(fetch_rollup('day', db_path))
+    type_counts = fetch_workout_type_counts(db_path)
+    # version=None disables the rendered-chart cache, so every call draws from scratch
+    history_cases.update({
+        'plot_workout_by_weekday_heatmap':
+            lambda: plot_workout_by_weekday_heatmap(daily['weekday_matrix'], daily['week_labels'], None),
+        'plot_calendar_month_heatmap':
+            lambda: plot_calendar_month_heatmap(daily['calendar_matrix'], daily['month_labels'], None),
+        'plot_monthly_workout_volume':
+            lambda: plot_monthly_workout_volume(daily['monthly_volume'], daily['month_labels'], None),
+        'plot_workout_type_distribution':
+            lambda: plot_workout_type_distribution(type_counts, 'Outdoor Run', None),
+    })
+    for name, fn in history_cases.items():
+        key = f"{name}[{history}workouts]"
+        results[key] = dict(measure(fn, repeat), rows=history)
+        print(f"  {key}: {results[key]['seconds'] * 1000:.1f} ms")
+    return results
+
+def compare(results, baseline, tolerance):
+    """
+    Prints each benchmark against the baseline and returns the names slower by more than `tolerance`.
+    """
+    regressions = []
+    print(f"\n{'benchmark':<52} {'baseline':>10} {'current':>10} {'change':>8}")
+    for name, result in results.items():
+        before = baseline.get(name)
+        if before is None:
+            print(f"{name:<52} {'-':>10} {result['seconds'] * 1000:>8.1f}ms {'new':>8}")
+            continue
+        change = result['seconds'] / before['seconds'] - 1 if before['seconds'] else 0.0
+        flag = ' !' if change > tolerance else ''
+        print(f"{name:<52} {before['seconds'] * 1000:>8.1f}ms {result['seconds'] * 1000:>8.1f}ms {change:>+7.0%}{flag}")
+        if change > tolerance:
+            regressions.append(name)
+    return regressions
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('--minutes', type=float, nargs='+', default=DEFAULT_MINUTES,
+                            help='Workout durations to generate, in minutes (1 Hz samples)')
+    arg_parser.add_argument('--missing', type=float, default=0.02, help='Share of missing sensor values')
+    arg_parser.add_argument('--history', type=int, default=DEFAULT_HISTORY, help='Workouts in the benchmark log')
+    arg_parser.add_argument('--repeat', type=int, default=3)
+    arg_parser.add_argument('--output', default=None, help='Write results to this JSON file')
+    arg_parser.add_argument('--baseline', default=None, help='Earlier results JSON to compare against')
+    arg_parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Slowdown against the baseline that counts as a regression (default 20%%)')
+    args = arg_parser.parse_args()
+
+    # Charts are drawn outside a Streamlit session; silence its "missing ScriptRunContext" warnings
+    set_log_level('error')
+    set_metrics_path(None)  # Keep the timing spans out of the app's metrics sink
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run(args.minutes, args.missing, args.history, args.repeat, work_dir)
+
+    report = {
+        'meta': {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'missing_share': args.missing,
+            'repeat': args.repeat,
+        },
+        'results': results,
+    }
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)['results']
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nFAIL: {len(regressions)} benchmark(s) more than {args.tolerance:.0%} slower than the baseline")
+            return 1
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
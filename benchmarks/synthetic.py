@@ -0,0 +1,97 @@
+"""
+Synthetic HealthFit export generator.
+
+Writes semicolon-separated, decimal-comma CSVs shaped like HealthFit exports,
+at 1 Hz, with a chosen duration, set of optional columns and share of missing
+values. Used by the benchmark harness; also handy for trying the dashboard.
+
+Usage: python benchmarks/synthetic.py OUT_DIR [--minutes 10 60 1440] [--missing 0.02]
+"""
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+# Optional sensor columns ('gps' is latitude + longitude); heart rate and time are always present
+OPTIONAL_COLUMNS = ['power', 'cadence', 'elevation', 'distance', 'gps']
+DEFAULT_START = '2024-05-01 06:30:00'
+
+
+def _wander(rng, n, mean, spread, low, high, noise=0.0):
+    # Slow, bounded variation around `mean` (a few sines with random periods) plus sensor noise
+    t = np.arange(n)
+    periods = rng.uniform(120, 1800, 3)
+    phases = rng.uniform(0, 2 * np.pi, 3)
+    wave = np.sin(2 * np.pi * t[:, None] / periods + phases).sum(axis=1) / 3
+    return np.clip(mean + spread * wave + rng.normal(0, noise, n), low, high)
+
+def make_samples(minutes, columns=OPTIONAL_COLUMNS, missing_share=0.0, seed=0, start=DEFAULT_START):
+    """
+    Builds the export as a DataFrame with HealthFit column names, one row per second.
+    """
+    rng = np.random.default_rng(seed)
+    n = int(minutes * 60)
+    since_start = np.arange(n, dtype=float)
+    times = pd.Timestamp(start) + pd.to_timedelta(since_start, unit='s')
+    speed = _wander(rng, n, 3.0, 0.8, 1.0, 6.0, noise=0.1)  # m/s
+    distance = np.cumsum(speed)
+
+    df = pd.DataFrame({
+        'timestamp': (times - pd.Timestamp(0)).total_seconds(),
+        'date': times.strftime('%Y-%m-%d %H:%M:%S'),
+        'iso8601': times.strftime('%Y-%m-%dT%H:%M:%SZ'),
+        'since_start': since_start,
+        'HR (count/min)': np.round(_wander(rng, n, 140, 20, 90, 190, noise=2)),
+    })
+    if 'power' in columns:
+        df['Power (W)'] = np.round(_wander(rng, n, 220, 60, 0, 600, noise=25))
+    if 'cadence' in columns:
+        df['Cadence (count/min)'] = np.round(_wander(rng, n, 85, 6, 60, 110, noise=2))
+    if 'gps' in columns:
+        heading = np.cumsum(rng.normal(0, 0.02, n))  # Wandering course
+        df['latitude'] = 45.46 + np.cumsum(speed * np.cos(heading)) / 111_320
+        df['longitude'] = 9.19 + np.cumsum(speed * np.sin(heading)) / (111_320 * np.cos(np.radians(45.46)))
+    if 'elevation' in columns:
+        df['Elevation (m)'] = np.round(_wander(rng, n, 120, 40, 0, 3000, noise=0.3), 1)
+    if 'distance' in columns:
+        df['Distance (m)'] = np.round(distance, 1)
+    df['lap'] = (distance // 1000 + 1).astype(int)
+
+    if missing_share > 0:
+        # Dropouts hit sensor columns only, never the time axis
+        for col in df.columns[4:-1]:
+            df.loc[rng.random(n) < missing_share, col] = np.nan
+    return df
+
+def write_export(path, minutes, columns=OPTIONAL_COLUMNS, missing_share=0.0, seed=0, start=DEFAULT_START):
+    """
+    Writes one synthetic export to `path` (semicolon separator, decimal comma) and returns the row count.
+    """
+    df = make_samples(minutes, columns, missing_share, seed, start)
+    df.to_csv(path, sep=';', decimal=',', index=False, na_rep='')
+    return len(df)
+
+def export_name(minutes, start=DEFAULT_START):
+    # HealthFit-style name, so the workout date and type are inferred like for real files
+    return f"{pd.Timestamp(start):%Y-%m-%d-%H%M%S}-Outdoor Run-{int(minutes)}min.csv"
+
+def main():
+    arg_parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    arg_parser.add_argument('out_dir')
+    arg_parser.add_argument('--minutes', type=float, nargs='+', default=[10, 60, 360, 1440])
+    arg_parser.add_argument('--missing', type=float, default=0.02, help='Share of missing sensor values (0-1)')
+    arg_parser.add_argument('--columns', nargs='*', default=OPTIONAL_COLUMNS,
+                            choices=OPTIONAL_COLUMNS, help='Optional columns to include')
+    arg_parser.add_argument('--seed', type=int, default=0)
+    args = arg_parser.parse_args()
+
+    os.makedirs(args.out_dir, exist_ok=True)
+    for minutes in args.minutes:
+        path = os.path.join(args.out_dir, export_name(minutes))
+        rows = write_export(path, minutes, args.columns, args.missing, args.seed)
+        print(f"{path}: {rows} rows")
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,56 +1,108 @@
 import streamlit as st
 import pandas as pd
-import sqlite3
-from parser.csv_parser import parse_csv_file  
-from utils.stats_utils import analyze_workout_data, format_stats_for_ai, extract_text_after_tag
-from model.llm_handler import ask_local_llm
-from model.logger import log_workout
+from parser.formats import read_workout_samples, workout_start_date, WORKOUT_EXTENSIONS
+from parser.sample_cache import content_hash
+from utils.stats_utils import analyze_workout_data, analyze_workout_stream, workout_calories, infer_workout_type
+from utils.metrics import compute_metrics, with_sample_metrics, training_load
+from utils.track import track_blob, decode_track
+from utils.timing import span, timed_run, read_spans, stage_summary
+from model.llm_handler import get_client, hide_reasoning
+from model.recommender import enqueue, fetch_job, worker_running, POLL_SECONDS
+from model.logger import log_workout, fetch_workout_page, fetch_workout_count, fetch_log_version, fetch_rollup, fetch_workout_type_counts, fetch_training_form
+from model.logger import LOG_VIEW_COLUMNS, DEFAULT_LOG_COLUMNS
+from model.storage import init_db, athlete_db_path, list_athletes
+from model.prompt_builder import build_prompt, estimate_tokens
+from visualisations.aggregate import aggregate_history
 from visualisations.calendar import plot_workout_by_weekday_heatmap, plot_calendar_month_heatmap
 from visualisations.charts import plot_monthly_workout_volume, plot_workout_type_distribution
-import os
 import re
+import time
+from datetime import date
 
-# Function to initialize SQLite database and create the workouts table if not already created
-def init_db():
-    conn = sqlite3.connect('data/workout_log.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS workouts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT,
-        file_name TEXT,
-        workout_type TEXT,
-        total_distance REAL,
-        duration_min REAL,
-        avg_heart_rate INTEGER,
-        avg_cadence INTEGER,
-        avg_power INTEGER,
-        avg_elevation INTEGER,
-        elevation_gain INTEGER,
-        total_calories INTEGER
-    )
-    ''')
-    conn.commit()
-    conn.close()
-
-# Function to fetch workout log from SQLite
-def fetch_workout_log():
-    conn = sqlite3.connect('data/workout_log.db')
-    query = "SELECT * FROM workouts ORDER BY date DESC"
-    df = pd.read_sql(query, conn)
-    conn.close()
-    return df
+# Uploads larger than this are analysed in streaming mode to keep memory flat
+STREAMING_THRESHOLD_BYTES = 50 * 1024 * 1024
 
-# Function to display workout data and AI suggestion
-def display_workout_data(uploaded_file, user_gender, weight_kg, height_cm, age, fitness_goal, fitness_level, workout_preference, has_injury, weekly_availability, time_per_session, target_focus):
-    # Save the uploaded file temporarily
-    temp_file_path = "temp.csv"  # Updated to handle CSV file
-    with open(temp_file_path, "wb") as f:
-        f.write(uploaded_file.getbuffer())
+# Pipeline stages, each memoized on exactly the inputs it depends on, so a rerun only
+# recomputes what the changed widget affects. The file is identified by its content hash;
+# `_uploaded_file` (leading underscore) is not part of the cache key.
+
+@st.cache_data(max_entries=4, show_spinner=False)
+def load_samples(file_hash, _uploaded_file):
+    parse_info = {}
+    samples = read_workout_samples(_uploaded_file, parse_info=parse_info)  # Also served from the on-disk sample cache on re-upload
+    return samples, parse_info
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def workout_analysis(file_hash, _uploaded_file):
+    # Everything but the calories, which are the only stat that depends on the body profile
+    if _uploaded_file.size > STREAMING_THRESHOLD_BYTES:
+        parse_info = {}
+        stats = analyze_workout_stream(_uploaded_file, None, None, None, None, parse_info=parse_info)
+        return stats, parse_info
+    samples, parse_info = load_samples(file_hash, _uploaded_file)
+    return analyze_workout_data(samples, None, None, None, None), parse_info
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def start_date_of(file_hash, _uploaded_file):
+    return workout_start_date(_uploaded_file)  # Only the first samples are read
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def calories_for(stats, user_gender, weight_kg, height_cm, age):
+    return workout_calories(stats, user_gender, weight_kg, height_cm, age)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def workout_metrics(file_hash, _uploaded_file, user_gender, weight_kg, age, ftp):
+    samples, _ = load_samples(file_hash, _uploaded_file)
+    return compute_metrics(samples, user_gender, weight_kg, age, ftp=ftp)
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def workout_track(file_hash, _uploaded_file):
+    samples, _ = load_samples(file_hash, _uploaded_file)
+    return track_blob(samples)  # Simplified to at most MAX_TRACK_POINTS fixes for the map and the log
 
+@st.cache_data(max_entries=8, show_spinner=False)
+def training_form_at(db_path, log_version, day):
+    # CTL/ATL/TSB decay every day, so a session left open past midnight must not keep yesterday's form
+    return fetch_training_form(day, db_path)
+
+@st.cache_data(max_entries=32, show_spinner=False)
+def workout_prompt(stats, profile, workout_type, workout_date, db_path, log_version, day):
+    # Keyed on the day like training_form_at, so the prompt never outlives the form shown beside it
+    return build_prompt(stats, profile, workout_type, workout_date, db_path)  # Profile, history digest, this workout
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def history_data(db_path, log_version):
+    daily_rollup = fetch_rollup('day', db_path)
+    history = aggregate_history(daily_rollup) if not daily_rollup.empty else None
+    return history, fetch_workout_type_counts(db_path), len(daily_rollup)
+
+def log_once(uploaded_file, file_hash, stats, workout_type, workout_date, load, track, db_path):
+    # Rewriting an unchanged row would still bump the log version and invalidate every
+    # stage keyed on it, so each (athlete, file, date, result) is logged once per session
+    logged = st.session_state.setdefault('logged_workouts', set())
+    key = repr((db_path, file_hash, workout_type, workout_date, sorted(stats.items()), load))
+    if key not in logged:
+        log_workout(uploaded_file, stats, workout_type, file_hash, db_path, training_load=load, track=track,
+                    workout_date=workout_date)
+        logged.add(key)
+
+# Function to display workout data and AI suggestion
+def display_workout_data(uploaded_file, user_gender, weight_kg, height_cm, age, fitness_goal, fitness_level, workout_preference, has_injury, weekly_availability, time_per_session, target_focus, ftp=None, db_path=None):
     # Parse and analyze the CSV file
-    workout_data = parse_csv_file(uploaded_file)  # Updated function to parse CSV
-    stats = analyze_workout_data(workout_data, user_gender, weight_kg, height_cm, age)
+    metrics = None  # Per-sample metrics and the GPS track need the full sample arrays, so streamed files skip them
+    track = None
+    file_hash = content_hash(uploaded_file)
+    with span('analyze') as record:
+        stats, parse_info = workout_analysis(file_hash, uploaded_file)
+        stats = dict(stats, total_calories=calories_for(stats, user_gender, weight_kg, height_cm, age))
+        record['rows'] = parse_info['rows']
+    if uploaded_file.size <= STREAMING_THRESHOLD_BYTES:
+        with span('metrics', rows=parse_info['rows']):
+            metrics = workout_metrics(file_hash, uploaded_file, user_gender, weight_kg, age, ftp)
+        stats = with_sample_metrics(stats, metrics)  # Filtered climbing and heart-rate calories for the log and the prompt
+        with span('track', rows=parse_info['rows']):
+            track = workout_track(file_hash, uploaded_file)
+    st.caption(f"Parsed {parse_info['rows']} samples in {parse_info['seconds'] * 1000:.0f} ms ({parse_info['engine']} engine)")
     
     # Display stats
     if stats.get('workout_type') is not None:
@@ -89,35 +141,15 @@ def display_workout_data(uploaded_file, user_gender, weight_kg, height_cm, age,
         st.write(f"**Elevation Gain**: {stats['elevation_gain']:.0f} m")
     else:
         st.write("**Elevation Gain**: Not available")
+
+    if metrics is not None:
+        display_training_metrics(metrics)
+    if track is not None:
+        st.map(decode_track(track), latitude='latitude', longitude='longitude', size=2)
      
     # Infer workout type from file name or let user select
     file_name = uploaded_file.name.lower()
-    if "outdoor" in file_name and "run" in file_name:
-        inferred_type = "Outdoor Run"
-    elif "outdoor" in file_name and "walk" in file_name:
-        inferred_type = "Outdoor Walk"
-    elif "functional" in file_name and "strength" in file_name:
-        inferred_type = "Functional Strength Training"
-    elif "indoor" in file_name and "run" in file_name:
-        inferred_type = "Indoor Running"
-    elif "indoor" in file_name and "cycling" in file_name: 
-        inferred_type = "Indoor Cycling"
-    elif "indoor" in file_name and "walk" in file_name:
-        inferred_type = "Indoor Walk"
-    elif "traditional" in file_name and "strength" in file_name:
-        inferred_type = "Traditional Strength Training"
-    elif "outdoor" in file_name and "cycling" in file_name:
-        inferred_type = "Outdoor Cycling"
-    elif "hiking" in file_name or "trekking" in file_name:
-        inferred_type = "Hiking"
-    elif "swimming" in file_name:  
-        inferred_type = "Swimming"
-    elif "yoga" in file_name:
-        inferred_type = "Yoga"
-    elif "tennis" in file_name:
-        inferred_type = "Tennis"
-    else:
-        inferred_type = None
+    inferred_type = infer_workout_type(file_name)
 
     if inferred_type:
         workout_type = inferred_type
@@ -145,58 +177,199 @@ def display_workout_data(uploaded_file, user_gender, weight_kg, height_cm, age,
     if date_match:
         workout_date = date_match.group(1)
     else:
-        workout_date = st.date_input("Select the date of the workout").strftime("%Y-%m-%d")
+        # Default to the day the recording started, so re-opening the file on another day logs the same row
+        start_date = start_date_of(file_hash, uploaded_file)
+        default_date = date.fromisoformat(start_date) if start_date else date.today()
+        workout_date = st.date_input("Select the date of the workout", value=default_date).strftime("%Y-%m-%d")
+
+    # Charts and history-based stages are only recomputed when the workout log changes; the
+    # database is part of the key so athletes whose logs are at the same version never mix
+    log_version = (db_path, fetch_log_version(db_path))
+    today = date.today().isoformat()
+
+    # Fitness, fatigue and form from the logged history (read in O(1) from the training load series)
+    with span('training_form'):
+        training_form = training_form_at(db_path, log_version, today)
+    if training_form is not None:
+        st.subheader("🏋️ Training Load")
+        col_ctl, col_atl, col_tsb = st.columns(3)
+        col_ctl.metric("Fitness (CTL)", f"{training_form['ctl']:.0f}")
+        col_atl.metric("Fatigue (ATL)", f"{training_form['atl']:.0f}")
+        col_tsb.metric("Form (TSB)", f"{training_form['tsb']:+.0f}")
+
+    # Generate AI prompt and start the suggestion now, so the model works while the charts are drawn
+    profile = {
+        'gender': user_gender, 'age': age, 'weight_kg': weight_kg, 'height_cm': height_cm,
+        'fitness_goal': fitness_goal, 'fitness_level': fitness_level, 'workout_preference': workout_preference,
+        'has_injury': has_injury, 'weekly_availability': weekly_availability,
+        'time_per_session': time_per_session, 'target_focus': target_focus,
+    }
+    with span('prompt') as record:
+        prompt = workout_prompt(stats, profile, workout_type, workout_date, db_path, log_version, today)
+        record['tokens'] = estimate_tokens(prompt)
+    refresh_suggestion = st.session_state.get("refresh_suggestion", False)  # "New suggestion" clicked on this rerun
+    # With a worker running (python -m model.recommender) the suggestion is a queued job that
+    # survives reruns and closed tabs; otherwise it is streamed from this session as before
+    job_id = enqueue(prompt, refresh=refresh_suggestion) if worker_running() else None
+    if job_id is None:
+        stream_stats = {}
+        # If a rerun interrupts the script before the answer is shown, the dropped stream cancels the request
+        suggestion_stream = get_client().start_stream(prompt, refresh=refresh_suggestion, stats=stream_stats)
 
     # Insert workout visualisations here (after stats and before AI prompt)
-    workout_log = fetch_workout_log()
-    if not workout_log.empty:
+    with span('history') as record:
+        history, type_counts, record['rows'] = history_data(db_path, log_version)
+    if history is not None:
         st.subheader("📊 Last Workout in Context")
 
         col1, col2 = st.columns(2)
         with col1:
             st.markdown("### Weekday vs. Week Number")
-            plot_workout_by_weekday_heatmap(workout_log)
+            plot_workout_by_weekday_heatmap(history['weekday_matrix'], history['week_labels'], log_version)
 
         with col2:
             st.markdown("### Day of Month vs. Month")
-            plot_calendar_month_heatmap(workout_log)
+            plot_calendar_month_heatmap(history['calendar_matrix'], history['month_labels'], log_version)
 
         st.subheader("📈 Workout Insights")
 
         col3, col4 = st.columns(2)
         with col3:
             st.markdown("### Monthly Workout Volume")
-            plot_monthly_workout_volume(workout_log)
+            plot_monthly_workout_volume(history['monthly_volume'], history['month_labels'], log_version)
 
         with col4:
             st.markdown("### Workout Type Distribution")
-            plot_workout_type_distribution(workout_log, workout_type)
+            plot_workout_type_distribution(type_counts, workout_type, log_version)
     else:
         st.warning("No old workout data available to display visualisations.")
         
-    # Generate AI prompt and display the workout suggestion
-    prompt = format_stats_for_ai(stats, user_gender, age, weight_kg, height_cm, fitness_goal, workout_type, fitness_level, workout_preference, has_injury, weekly_availability, time_per_session, target_focus)
+    # Display the workout suggestion
     st.subheader("🤖 AI Suggested Workout")
-    with st.spinner("Thinking..."):
-        # Call the AI function directly
-        try:
-            suggestion = ask_local_llm(prompt)
-            suggested_workout = extract_text_after_tag(suggestion, r'</think>')
-        except Exception as e:
-            error_msg = f"Error processing workout: {e}"
-            print(error_msg)
-    st.success(suggested_workout)
+    st.button("🔄 New suggestion", key="refresh_suggestion")  # Skip the cached answer and sample the model again
+    if job_id is not None:
+        display_queued_suggestion(job_id)
+    else:
+        # Stream the answer onto the page as it is generated; the <think> block is hidden on the fly
+        with span('suggestion_display') as record:
+            try:
+                st.write_stream(suggestion_stream)
+            finally:
+                suggestion_stream.close()  # Hang up at once if a rerun interrupts the stream
+            record['tokens'] = stream_stats.get('tokens')
+        if stream_stats.get("cached"):
+            st.caption("Served from the suggestion cache")
+        elif "time_to_first_token" in stream_stats:
+            st.caption(f"First token after {stream_stats['time_to_first_token']:.1f} s · "
+                       f"{stream_stats['tokens_per_second']:.1f} tokens/s · {stream_stats['tokens']} tokens")
 
     # Log workout in SQLite
-    log_workout(uploaded_file, stats, workout_type)
-
-    # Remove the temp file after processing
-    os.remove(temp_file_path)
+    log_once(uploaded_file, file_hash, stats, workout_type, workout_date, training_load(stats, metrics, age), track, db_path)
     
 
+def display_queued_suggestion(job_id):
+    # Poll the job; every loop touches the page, so a rerun (new sidebar value) can interrupt
+    # the wait without cancelling the job, and the next rerun picks up the same job
+    with span('suggestion_wait') as record:
+        status = st.empty()
+        job = fetch_job(job_id)
+        while job['status'] in ('pending', 'running'):
+            if job['status'] == 'pending' and not worker_running():
+                status.warning("The recommendation worker stopped. Start it with `python -m model.recommender`; "
+                               "the suggestion stays queued.")
+                return
+            status.caption(f"Suggestion {job['status']} in the background worker…")
+            time.sleep(POLL_SECONDS)
+            job = fetch_job(job_id)
+        status.empty()
+        record['job_status'] = job['status']
+    if job['status'] == 'done':
+        st.markdown(''.join(hide_reasoning([job['result']])))
+        st.caption(f"Generated by the background worker in {job['duration']:.1f} s")
+    else:
+        st.error(f"The suggestion failed after {job['attempts']} attempts: {job['error']}")
+
+def display_training_metrics(metrics):
+    st.subheader("⚡ Training Metrics")
+    if metrics['moving_speed'] is not None:
+        st.write(f"**Moving speed**: {metrics['moving_speed'] * 3.6:.1f} km/h · max: {metrics['max_speed'] * 3.6:.1f} km/h")
+    if metrics['normalized_power'] is not None:
+        st.write(f"**Normalized Power**: {metrics['normalized_power']:.0f} W · best 30 s: {metrics['max_power_30s']:.0f} W")
+        if metrics['tss'] is not None:
+            st.write(f"**Intensity Factor**: {metrics['intensity_factor']:.2f} · **TSS**: {metrics['tss']:.0f}")
+        else:
+            st.caption("Set your FTP in the sidebar to see Intensity Factor and TSS.")
+    if metrics['hr_zone_seconds'] is not None:
+        st.markdown("**Time in heart-rate zones (min)**")
+        zone_minutes = pd.Series(metrics['hr_zone_seconds'], index=[f"Z{i}" for i in range(1, 6)]) / 60
+        st.bar_chart(zone_minutes)
+    if metrics['splits']:
+        st.markdown("**Splits**")
+        splits = pd.DataFrame(metrics['splits'])
+        splits['pace'] = splits['pace_s_per_km'].map(lambda s: f"{int(s // 60)}:{int(s % 60):02d} /km")
+        st.dataframe(splits[['split', 'meters', 'seconds', 'pace']], hide_index=True)
+
+def display_timings():
+    st.subheader("⏱ Pipeline Timings")
+    last_runs = st.number_input("Last N uploads", min_value=1, max_value=500, value=20)
+    spans = read_spans(last_runs)
+    if spans.empty:
+        st.write("No timings recorded yet. Upload a workout to record one.")
+        return
+    st.caption(f"{spans['run'].nunique()} runs, slowest stages first (p95)")
+    st.dataframe(stage_summary(spans).round(1))
+    spans['started'] = pd.to_datetime(spans.groupby('run')['start'].transform('min'), unit='s').dt.floor('s')
+    per_run = spans.pivot_table(index='started', columns='stage', values='seconds', aggfunc='sum', sort=False) * 1000
+    st.markdown("**Per upload (ms)**")
+    st.dataframe(per_run.round(0))
+
+def display_workout_log(db_path):
+    """
+    One page of the workout log at a time: filters and paging run in SQLite, so the
+    page costs the same however long the history is.
+    """
+    st.subheader("📜 Workout Log")
+    col_from, col_to, col_types = st.columns([1, 1, 2])
+    start_date = col_from.date_input("From", value=None)
+    end_date = col_to.date_input("To", value=None)
+    workout_types = col_types.multiselect("Workout types", fetch_workout_type_counts(db_path).index.tolist())
+    columns = st.multiselect("Columns", LOG_VIEW_COLUMNS, default=DEFAULT_LOG_COLUMNS) or ['date']
+
+    # Keyset cursor of every page visited so far; changing a filter starts again from the newest page
+    filters = (db_path, start_date, end_date, tuple(workout_types))
+    if st.session_state.get('log_filters') != filters:
+        st.session_state['log_filters'] = filters
+        st.session_state['log_cursors'] = [None]
+    cursors = st.session_state['log_cursors']
+
+    page, next_cursor = fetch_workout_page(columns, start_date, end_date, workout_types, cursors[-1], db_path=db_path)
+    if page.empty and len(cursors) == 1:
+        st.write("No past workout data found.")
+        return
+    st.dataframe(page, hide_index=True)
+
+    col_newer, col_info, col_older = st.columns([1, 2, 1])
+    if col_newer.button("◀ Newer", disabled=len(cursors) == 1):
+        cursors.pop()
+        st.rerun()
+    total = fetch_workout_count(start_date, end_date, workout_types, db_path)
+    col_info.caption(f"Page {len(cursors)} · {total} workouts")
+    if col_older.button("Older ▶", disabled=next_cursor is None):
+        cursors.append(next_cursor)
+        st.rerun()
+
 # Streamlit app layout
 st.title("🏃 AI Fitness Coach")
 
+st.sidebar.header("Athlete")
+athlete = st.sidebar.selectbox("Athlete", list_athletes())
+new_athlete = st.sidebar.text_input("Or add an athlete (id)").strip()
+try:
+    db_path = athlete_db_path(new_athlete or athlete)  # One database per athlete
+except ValueError as e:
+    st.sidebar.error(str(e))
+    st.stop()
+
 st.sidebar.header("User Information")
 user_gender = st.sidebar.selectbox("Gender", ["Male", "Female", "Other"])
 weight_kg = st.sidebar.number_input("Weight (kg)", min_value=30, max_value=200, step=1)
@@ -209,21 +382,21 @@ has_injury = st.sidebar.text_input("Injury or limitations (optional)")
 weekly_availability = st.sidebar.slider("Days available to train per week", 1, 7, 3)
 time_per_session = st.sidebar.slider("Time per workout session (minutes)", 15, 120, 45, step=15)
 target_focus = st.sidebar.selectbox("Primary fitness goal", ["Endurance", "Strength", "Flexibility", "Cardio", "General fitness"])
+ftp = st.sidebar.number_input("FTP (W, 0 if unknown)", min_value=0, max_value=600, step=5)
+show_timings = st.sidebar.checkbox("Show pipeline timings")
 
 
-init_db()
+init_db(db_path)
 
 # File uploader
-uploaded_file = st.file_uploader("Upload a CSV file", type="csv")  # Updated to accept CSV files
+uploaded_file = st.file_uploader("Upload a workout file (CSV, GPX or FIT)", type=WORKOUT_EXTENSIONS)
 
 if uploaded_file:
-    display_workout_data(uploaded_file, user_gender, weight_kg, height_cm, age, fitness_goal, fitness_level, workout_preference, has_injury, weekly_availability, time_per_session, target_focus)
+    with timed_run('upload', file_bytes=uploaded_file.size):
+        display_workout_data(uploaded_file, user_gender, weight_kg, height_cm, age, fitness_goal, fitness_level, workout_preference, has_injury, weekly_availability, time_per_session, target_focus, ftp or None, db_path)
 
 # Display past workout log
-st.subheader("📜 Workout Log")
-workout_log = fetch_workout_log()
+display_workout_log(db_path)
 
-if workout_log.empty:
-    st.write("No past workout data found.")
-else:
-    st.dataframe(workout_log)
\ No newline at end of file
+if show_timings:
+    display_timings()
\ No newline at end of file
@@ -1,64 +1,144 @@
-from parser.csv_parser import parse_csv_file
-from utils.stats_utils import analyze_workout_data, format_stats_for_ai
-from model.recommender import ask_local_llm
-import tkinter as tk
-from tkinter import ttk, Tk, StringVar, Frame, filedialog, Radiobutton
-
-
-def main():
-    def proceed():
-        file_path = filedialog.askopenfilename(filetypes=[("CSV files", "*.csv")])
-        if not file_path:
-            print("❌ No file selected.")
-            return
-
-        try:
-            workout_data = parse_csv_file(file_path)
-            stats = analyze_workout_data(
-                workout_data,
-                user_gender=int(gender_var.get()),
-                weight_kg=float(weight_kg_var.get()),
-                height_cm=float(height_cm_var.get()),
-                age=int(age_var.get())
-            )
-            print(f"Workout summary: {stats}")
-
-            prompt = format_stats_for_ai(stats)
-            print("\nAsking AI:\n", prompt)
-
-            suggestion = ask_local_llm(prompt)
-            print("\nSuggested workout:\n", suggestion)
-        except Exception as e:
-            print(f"Error during processing: {e}")
-
-    root = Tk()
-    root.title("Enter Your Info")
-
-    age_var = StringVar()
-    gender_var = StringVar(value="0")
-    weight_kg_var = StringVar()
-    height_cm_var = StringVar()
-
-    frame = ttk.Frame(root, padding="10")
-    frame.grid()
-
-    tk.Label(frame, text="Gender:").grid(row=0, column=0, sticky="w")
-    tk.Radiobutton(frame, text="Male", variable=gender_var, value="0").grid(row=0, column=1, sticky="w")
-    tk.Radiobutton(frame, text="Female", variable=gender_var, value="1").grid(row=0, column=2, sticky="w")
-
-    tk.Label(frame, text="Weight (kg):").grid(row=1, column=0, sticky="w")
-    ttk.Entry(frame, width=10, textvariable=weight_kg_var).grid(row=1, column=1, columnspan=2, sticky="w")
-
-    tk.Label(frame, text="Height (cm):").grid(row=2, column=0, sticky="w")
-    ttk.Entry(frame, width=10, textvariable=height_cm_var).grid(row=2, column=1, columnspan=2, sticky="w")
-
-    tk.Label(frame, text="Age:").grid(row=3, column=0, sticky="w")
-    ttk.Entry(frame, width=10, textvariable=age_var).grid(row=3, column=1, columnspan=2, sticky="w")
-
-    ttk.Button(frame, text="Continue", command=proceed).grid(row=4, column=0, columnspan=3, pady=10)
-
-    root.mainloop()
+"""
+Headless batch runner.
+
+Analyses one or more workout files (paths or glob patterns) in parallel worker
+processes and writes one JSON object per file to stdout (JSON Lines).
+LLM suggestions and logging to the workout database are optional.
+
+Example:
+    python main.py "exports/*.csv" --profile athlete.json --workers 4 --log
+"""
+import argparse
+import glob
+import json
+import math
+import sys
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from model.data_importer import analyze_file
+from model.logger import log_workouts
+from model.storage import athlete_db_path
+
+# Profile used when neither the profile file nor a flag sets a value
+DEFAULT_PROFILE = {
+    'gender': 'male',
+    'weight_kg': 70.0,
+    'height_cm': 175.0,
+    'age': 30,
+    'fitness_goal': 'Maintain form',
+    'fitness_level': 'Intermediate',
+    'workout_preference': 'No preference',
+    'has_injury': '',
+    'weekly_availability': 3,
+    'time_per_session': 45,
+    'target_focus': 'General fitness',
+}
+
+def expand_paths(patterns):
+    """
+    Expands glob patterns, keeping plain paths as given and dropping duplicates.
+    """
+    paths = []
+    for pattern in patterns:
+        matches = sorted(glob.glob(pattern, recursive=True)) if glob.has_magic(pattern) else [pattern]
+        for path in matches:
+            if path not in paths:
+                paths.append(path)
+    return paths
+
+def load_profile(args):
+    profile = dict(DEFAULT_PROFILE)
+    if args.profile:
+        with open(args.profile) as f:
+            profile.update(json.load(f))
+    for key in ['gender', 'weight_kg', 'height_cm', 'age']:
+        if getattr(args, key) is not None:
+            profile[key] = getattr(args, key)
+    return profile
+
+def _json_number(value):
+    # NaN/inf are not valid JSON, and numpy scalars are not serialisable
+    if value is None:
+        return None
+    value = float(value)
+    return value if math.isfinite(value) else None
+
+def suggest_workout(stats, workout_type, workout_date, profile, db_path=None):
+    # Only loaded when suggestions are requested, so plain analysis runs stay lightweight
+    from model.prompt_builder import build_prompt
+    from model.llm_handler import ask_local_llm, hide_reasoning
+    from model.recommender import enqueue, wait_for_job, worker_running
+
+    prompt = build_prompt(stats, profile, workout_type or 'Other Activity', workout_date, db_path)
+    if worker_running():
+        # Share the model server with the dashboard through the recommendation queue
+        job = wait_for_job(enqueue(prompt))
+        if job['status'] != 'done':
+            return f"Suggestion {job['status']}: {job['error'] or 'still queued'}"
+        answer = job['result']
+    else:
+        answer = ask_local_llm(prompt)
+    return ''.join(hide_reasoning([answer]))
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Analyse workout files and print per-file stats as JSON Lines.")
+    arg_parser.add_argument('files', nargs='+', help="Workout files or glob patterns")
+    arg_parser.add_argument('--profile', help="JSON file with gender, weight_kg, height_cm, age and optional goal fields")
+    arg_parser.add_argument('--gender', choices=['male', 'female'])
+    arg_parser.add_argument('--weight', dest='weight_kg', type=float, help="Weight in kg")
+    arg_parser.add_argument('--height', dest='height_cm', type=float, help="Height in cm")
+    arg_parser.add_argument('--age', type=int)
+    arg_parser.add_argument('--workers', type=int, default=None, help="Worker processes (default: CPU count)")
+    arg_parser.add_argument('--llm', action='store_true', help="Ask the local LLM for a suggested next workout")
+    arg_parser.add_argument('--log', action='store_true', help="Log each workout to the SQLite database")
+    arg_parser.add_argument('--athlete', default=None, help="Athlete whose workout log to use (default: the single-user log)")
+    arg_parser.add_argument('--db', default=None, help="SQLite database path (overrides --athlete)")
+    args = arg_parser.parse_args(argv)
+
+    profile = load_profile(args)
+    try:
+        db_path = args.db or athlete_db_path(args.athlete)
+    except ValueError as e:
+        arg_parser.error(str(e))
+    paths = expand_paths(args.files)
+    if not paths:
+        print("No files matched.", file=sys.stderr)
+        return 1
+
+    rows = []
+    tracks = {}
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {
+            executor.submit(analyze_file, path, None, profile['gender'], profile['weight_kg'],
+                            profile['height_cm'], profile['age'], with_track=args.log): path
+            for path in paths
+        }
+        for future in as_completed(futures):
+            path = futures[future]
+            record = {'file': path}
+            try:
+                stats, row, track = future.result()
+            except Exception as e:
+                failed += 1
+                record['error'] = str(e)
+                print(json.dumps(record), flush=True)
+                continue
+
+            stats = {key: _json_number(value) for key, value in stats.items()}
+            workout_date, workout_type = row[0], row[2]
+            record.update({'workout_type': workout_type, 'stats': stats})
+            if args.llm:
+                record['suggestion'] = suggest_workout(stats, workout_type, workout_date, profile, db_path)
+            if args.log:
+                rows.append(row)
+                tracks[(row[-1], row[0])] = track
+            print(json.dumps(record), flush=True)
+
+    if rows:
+        log_workouts(rows, db_path, tracks)
+
+    return 1 if failed == len(paths) else 0
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
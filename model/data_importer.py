@@ -1,30 +1,109 @@
-import pandas as pd
+import argparse
+import glob
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from parser.formats import read_workout_samples, samples_start_date, WORKOUT_EXTENSIONS
+from parser.sample_cache import content_hash
+from utils.stats_utils import analyze_workout_data, infer_workout_type
+from utils.metrics import compute_metrics, with_sample_metrics, training_load
+from utils.track import track_blob
+from model.logger import workout_row, workout_date_from_name, log_workouts, fetch_logged_hashes
+from model.storage import athlete_db_path
 
-def load_csv_file(file_path):
+# Rows written per executemany transaction
+BATCH_SIZE = 200
+
+def find_workout_files(directory, extensions=WORKOUT_EXTENSIONS):
+    """
+    Lists every CSV, GPX and FIT workout under `directory`, recursively, in a stable order.
+    """
+    files = []
+    for extension in extensions:
+        for pattern in {f'*.{extension}', f'*.{extension.upper()}'}:
+            files += glob.glob(os.path.join(directory, '**', pattern), recursive=True)
+    return sorted(set(files))
+
+def analyze_file(file_path, file_hash, user_gender, weight_kg, height_cm, age, with_track=True):
+    """
+    Parses and analyses one export and returns its stats, its workouts table row and,
+    if asked, its simplified track. Runs inside a worker process (bulk import and main.py).
+    """
+    samples = read_workout_samples(file_path, use_cache=False)  # Bulk imports would only churn the cache
+    metrics = compute_metrics(samples, user_gender, weight_kg, age)
+    stats = with_sample_metrics(analyze_workout_data(samples, user_gender, weight_kg, height_cm, age), metrics)
+    file_name = os.path.basename(file_path)
+    workout_date = workout_date_from_name(file_name, samples_start_date(samples))
+    row = workout_row(file_name, stats, infer_workout_type(file_name), file_hash or content_hash(file_path),
+                      training_load(stats, metrics, age), workout_date)
+    return stats, row, track_blob(samples) if with_track else None
+
+def import_directory(directory, user_gender, weight_kg, height_cm, age,
+                     workers=None, batch_size=BATCH_SIZE, db_path=None, progress=print):
     """
-    Loads and parses a CSV file and returns a list of data.
+    Imports every workout export under `directory` into the workouts table.
+    Files are parsed and analysed in a process pool, rows are written in batched
+    transactions, and files whose content is already logged are skipped.
+    Returns a summary dict with imported, skipped and failed counts and the elapsed time.
     """
-    # Read the CSV file into a DataFrame, assuming tab-delimited or comma-delimited data
-    df = pd.read_csv(file_path, delimiter=';')  # Update delimiter as per CSV format (use ',' if it's comma-delimited)
-
-    # Extract relevant data from the DataFrame and return it as a list of dictionaries
-    data = []
-    for _, row in df.iterrows():
-        point_data = {
-            'timestamp': row['timestamp'],
-            'date': row['date'],
-            'ISO8601': row['ISO8601'],
-            'heart_rate': row['heart_rate'] if pd.notna(row['heart_rate']) else None,
-            'power': row['power'] if pd.notna(row['power']) else None,
-            'cadence': row['cadence'] if pd.notna(row['cadence']) else None,
-            'latitude': row['latitude'] if pd.notna(row['latitude']) else None,
-            'longitude': row['longitude'] if pd.notna(row['longitude']) else None,
-            'elevation': row['elevation'] if pd.notna(row['elevation']) else None,
-            'distance': row['distance'] if pd.notna(row['distance']) else None,
-            'lap': row['lap'] if pd.notna(row['lap']) else None,
-            'since_start': row['since_start'] if pd.notna(row['since_start']) else None
+    start = time.perf_counter()
+    files = find_workout_files(directory)
+    logged = fetch_logged_hashes(db_path)
+
+    pending = {}
+    for file_path in files:
+        file_hash = content_hash(file_path)
+        if file_hash not in logged:
+            pending.setdefault(file_hash, file_path)  # Identical copies are imported once
+    skipped = len(files) - len(pending)
+    progress(f"Found {len(files)} files, {skipped} already imported or duplicated.")
+
+    imported = failed = 0
+    batch = []
+    tracks = {}
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(analyze_file, file_path, file_hash, user_gender, weight_kg, height_cm, age): file_path
+            for file_hash, file_path in pending.items()
         }
-        data.append(point_data)
+        for done, future in enumerate(as_completed(futures), start=1):
+            try:
+                _, row, track = future.result()
+                batch.append(row)
+                tracks[(row[-1], row[0])] = track
+            except Exception as e:
+                failed += 1
+                progress(f"Skipping {futures[future]}: {e}")
+
+            if len(batch) >= batch_size:
+                log_workouts(batch, db_path, tracks)
+                imported += len(batch)
+                batch = []
+                tracks = {}
+                elapsed = time.perf_counter() - start
+                progress(f"{done}/{len(pending)} files processed ({done / elapsed:.1f} files/s)")
+
+    if batch:
+        log_workouts(batch, db_path, tracks)
+        imported += len(batch)
+
+    elapsed = time.perf_counter() - start
+    progress(f"Imported {imported} workouts in {elapsed:.1f} s ({imported / elapsed if elapsed else 0:.1f} files/s), "
+             f"{skipped} skipped, {failed} failed.")
+    return {'imported': imported, 'skipped': skipped, 'failed': failed, 'seconds': elapsed}
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description="Bulk-import a directory of CSV, GPX and FIT workouts.")
+    arg_parser.add_argument("directory")
+    arg_parser.add_argument("--gender", default="male")
+    arg_parser.add_argument("--weight", type=float, required=True, help="Weight in kg")
+    arg_parser.add_argument("--height", type=float, required=True, help="Height in cm")
+    arg_parser.add_argument("--age", type=int, required=True)
+    arg_parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    arg_parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    arg_parser.add_argument("--athlete", default=None, help="Athlete to import for (default: the single-user log)")
+    arg_parser.add_argument("--db", default=None, help="SQLite database path (overrides --athlete)")
+    args = arg_parser.parse_args()
 
-    return data
\ No newline at end of file
+    import_directory(args.directory, args.gender, args.weight, args.height, args.age,
+                     workers=args.workers, batch_size=args.batch_size, db_path=args.db or athlete_db_path(args.athlete))
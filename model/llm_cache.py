@@ -0,0 +1,93 @@
+import hashlib
+import json
+import os
+import sys
+import threading
+import time
+from model.storage import transaction
+
+CACHE_DB_PATH = os.path.join('data', 'llm_cache.db')
+CACHE_TTL_SECONDS = 7 * 24 * 3600
+CACHE_MAX_ENTRIES = 500
+
+# Hit/miss counters for this process
+cache_stats = {'hits': 0, 'misses': 0}
+_stats_lock = threading.Lock()
+
+
+def _create_cache_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS llm_cache (
+        key TEXT PRIMARY KEY,
+        response TEXT NOT NULL,
+        created_at REAL NOT NULL,
+        last_used REAL NOT NULL
+    )
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used)")
+
+CACHE_MIGRATIONS = [
+    _create_cache_table,
+]
+
+
+def cache_key(model, system_prompt, prompt, temperature):
+    """
+    Hashes everything that determines a completion into a cache key.
+    """
+    payload = json.dumps([model, system_prompt, prompt, temperature], ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+def _count(outcome):
+    with _stats_lock:
+        cache_stats[outcome] += 1
+
+def get_cached_response(key, ttl=CACHE_TTL_SECONDS, db_path=CACHE_DB_PATH):
+    """
+    Returns the cached response for `key`, or None if it is missing or older than `ttl` seconds.
+    """
+    now = time.time()
+    with transaction(db_path, CACHE_MIGRATIONS) as conn:
+        row = conn.execute("SELECT response, created_at FROM llm_cache WHERE key = ?", (key,)).fetchone()
+        if row is None or now - row[1] > ttl:
+            if row is not None:
+                conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+            response = None
+        else:
+            conn.execute("UPDATE llm_cache SET last_used = ? WHERE key = ?", (now, key))
+            response = row[0]
+
+    _count('misses' if response is None else 'hits')
+    return response
+
+def store_response(key, response, max_entries=CACHE_MAX_ENTRIES, db_path=CACHE_DB_PATH):
+    """
+    Stores a response and evicts the least recently used entries beyond `max_entries`.
+    """
+    now = time.time()
+    with transaction(db_path, CACHE_MIGRATIONS) as conn:
+        conn.execute('''
+        INSERT OR REPLACE INTO llm_cache (key, response, created_at, last_used)
+        VALUES (?, ?, ?, ?)
+        ''', (key, response, now, now))
+        conn.execute('''
+        DELETE FROM llm_cache WHERE key IN (
+            SELECT key FROM llm_cache ORDER BY last_used DESC LIMIT -1 OFFSET ?
+        )
+        ''', (max_entries,))
+
+def clear_cache(db_path=CACHE_DB_PATH):
+    """
+    Deletes every cached response and returns how many there were.
+    """
+    with transaction(db_path, CACHE_MIGRATIONS) as conn:
+        return conn.execute("DELETE FROM llm_cache").rowcount
+
+
+if __name__ == "__main__":
+    # Usage: python -m model.llm_cache clear [path/to/llm_cache.db]
+    if len(sys.argv) >= 2 and sys.argv[1] == "clear":
+        removed = clear_cache(*sys.argv[2:3])
+        print(f"Removed {removed} cached suggestions.")
+    else:
+        print("Usage: python -m model.llm_cache clear [db_path]")
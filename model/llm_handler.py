@@ -1,41 +1,350 @@
+import contextvars
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from model.llm_cache import cache_key, get_cached_response, store_response
+from utils.timing import span
 
-def ask_local_llm(prompt):
+LLM_URL = "http://127.0.0.1:1234/v1/chat/completions"
+MODEL_NAME = "local-model"  # LM Studio ignores this
+TEMPERATURE = 0.7
+
+# Sent first and never changes, so the server keeps it in its prefix cache
+SYSTEM_PROMPT = '''You are a personal fitness coach.
+I want you to suggest a workout plan based on my personal data and workout history.
+My message gives my athlete profile, then compact tables of my recent training (weekly volume, last sessions, training load), then the workout I just did, with distance, duration, heart rate, cadence, power, elevation and calories burned.
+You will analyze this data and suggest a workout plan that is tailored to my fitness level and goals in a friendly and encouraging manner.
+You will provide the workout plan in a structured format, including the type of workout, duration, intensity, and any other relevant details.
+You will also provide a brief explanation of why this workout is suitable for me based on the data I provided.
+You will not provide any other information or suggestions outside of the workout plan.
+You will not include any disclaimers or warnings about exercise or fitness.
+You will not ask me any questions or request any additional information.
+You will not provide any information about yourself or your capabilities.
+You will not provide any information about the AI or its limitations.'''
+
+THINK_START_TAG = "<think>"
+THINK_END_TAG = "</think>"
+
+CONNECT_TIMEOUT = 5      # seconds to establish the TCP connection
+READ_TIMEOUT = 300       # seconds of silence from the server before giving up
+MAX_RETRIES = 2
+RETRY_BACKOFF = 1.0      # seconds, doubled after every failed attempt
+MAX_CONCURRENCY = 2      # requests in flight per process
+
+_STREAM_DONE = object()
+
+
+class _BackgroundStream:
     """
-    Sends a prompt to the local LLM via /v1/chat/completions endpoint and returns the response.
+    Iterator over the deltas of a stream produced on another thread.
+    Closing it, or dropping the last reference to it (a Streamlit rerun abandons the
+    page mid-generation), sets `stop` so the producer hangs up on the server.
+    """
+
+    def __init__(self, deltas, stop):
+        self._deltas = deltas
+        self._stop = stop
+        self._done = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._done:
+            raise StopIteration
+        item = self._deltas.get()
+        if item is _STREAM_DONE or isinstance(item, BaseException):
+            self._done = True
+            self.close()
+            if item is _STREAM_DONE:
+                raise StopIteration
+            raise item
+        return item
+
+    def close(self):
+        self._stop.set()
+
+    def __del__(self):
+        self.close()
+
+
+class LLMClient:
+    """
+    Pooled, time-bounded client for the LM Studio server.
+    Connections are reused through one requests.Session, every request has connect
+    and read timeouts, connection failures and 5xx responses are retried with
+    exponential backoff, and at most `max_concurrency` requests run at once.
+    """
+
+    def __init__(self, url=LLM_URL, connect_timeout=CONNECT_TIMEOUT, read_timeout=READ_TIMEOUT,
+                 max_retries=MAX_RETRIES, backoff=RETRY_BACKOFF, max_concurrency=MAX_CONCURRENCY):
+        self.url = url
+        self.timeout = (connect_timeout, read_timeout)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("http://", adapter)
+        self.session.mount("https://", adapter)
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=max_concurrency, thread_name_prefix="llm")
+
+    def post(self, payload, stream=False):
+        """
+        POSTs `payload` and returns the response, retrying transient failures.
+        The caller must hold a concurrency slot (see slot()).
+        """
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(self.url, json=payload, timeout=self.timeout, stream=stream)
+                if response.status_code < 500 or attempt == self.max_retries:
+                    response.raise_for_status()
+                    return response
+                response.close()
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout):
+                if attempt == self.max_retries:
+                    raise
+            time.sleep(self.backoff * 2 ** attempt)
+
+    def slot(self):
+        return self._slots
+
+    def complete(self, payload, usage=None):
+        """
+        Returns the completion text; the server's token usage is copied into `usage` if given.
+        """
+        with self._slots:
+            response = self.post(payload)
+        body = response.json()
+        if usage is not None:
+            usage.update(body.get('usage') or {})
+        return body['choices'][0]['message']['content']
+
+    def submit(self, prompt, **kwargs):
+        """
+        Starts ask_local_llm in the background and returns a Future for its answer.
+        """
+        return self._executor.submit(ask_local_llm, prompt, client=self, **kwargs)
+
+    def start_stream(self, prompt, **kwargs):
+        """
+        Starts stream_local_llm in the background and returns an iterator over its
+        visible deltas. Deltas that arrive before the iterator is read are buffered,
+        so a page can start the request early and render the answer later. Closing or
+        dropping the iterator cancels the request and frees its concurrency slot.
+        """
+        deltas = queue.Queue()
+        stop = threading.Event()
+
+        def produce():
+            try:
+                for delta in stream_local_llm(prompt, client=self, stop=stop, **kwargs):
+                    deltas.put(delta)
+            except BaseException as e:
+                deltas.put(e)
+            deltas.put(_STREAM_DONE)
+
+        # Run in a copy of the caller's context, so the stream's timing span joins the caller's run
+        self._executor.submit(contextvars.copy_context().run, produce)
+        return _BackgroundStream(deltas, stop)
+
+    def close(self):
+        self._executor.shutdown(wait=False)
+        self.session.close()
+
+_default_client = None
+_default_client_lock = threading.Lock()
+
+def get_client():
+    """
+    Returns the process-wide LLMClient, creating it on first use.
     """
-    url = "http://127.0.0.1:1234/v1/chat/completions"
+    global _default_client
+    with _default_client_lock:
+        if _default_client is None:
+            _default_client = LLMClient()
+        return _default_client
 
+def _build_payload(prompt, temperature, stream=False):
     payload = {
-        "model": "local-model",  # LM Studio ignores this
+        "model": MODEL_NAME,
         "messages": [
-            {"role": "system", "content": '''
-             You are a personal fitness coach. 
-                I want you to suggest a workout plan based on my personal data and workout history.
-                I will provide you with my workout data, including distance, duration, heart rate, cadence, power, elevation, and calories burned.
-                You will analyze this data and suggest a workout plan that is tailored to my fitness level and goals in a friendly and encouraging manner.
-                You will provide the workout plan in a structured format, including the type of workout, duration, intensity, and any other relevant details.
-                You will also provide a brief explanation of why this workout is suitable for me based on the data I provided.
-                You will not provide any other information or suggestions outside of the workout plan.
-                You will not include any disclaimers or warnings about exercise or fitness.
-                You will not ask me any questions or request any additional information.
-                You will not provide any information about yourself or your capabilities.
-                You will not provide any information about the AI or its limitations.
-                '''},
+            {"role": "system", "content": SYSTEM_PROMPT},
             {"role": "user", "content": prompt}
         ],
-        "temperature": 0.7,
+        "temperature": temperature,
         #"max_tokens": 1012
     }
+    if stream:
+        payload["stream"] = True
+    return payload
+
+def ask_local_llm(prompt, temperature=TEMPERATURE, use_cache=True, refresh=False, client=None, raise_errors=False):
+    """
+    Sends a prompt to the local LLM via /v1/chat/completions endpoint and returns the response.
+    Responses are cached on disk by model, prompts and temperature. Pass use_cache=False
+    to bypass the cache entirely, or refresh=True to ask the model again and overwrite
+    the cached answer (e.g. to get a new sample at a non-zero temperature).
+    Errors are returned as text, unless `raise_errors` is set.
+    """
+    with span('llm.ask', prompt_chars=len(prompt)) as record:
+        key = cache_key(MODEL_NAME, SYSTEM_PROMPT, prompt, temperature)
+        if use_cache and not refresh:
+            cached = get_cached_response(key)
+            if cached is not None:
+                record['cached'] = True
+                return cached
+
+        client = client or get_client()
+        payload = _build_payload(prompt, temperature)
+        usage = {}
+
+        try:
+            content = client.complete(payload, usage)
+
+        except requests.exceptions.RequestException as e:
+            record['error'] = type(e).__name__
+            if raise_errors:
+                raise
+            return f"Error communicating with local LLM: {e}"
 
-    try:
-        response = requests.post(url, json=payload)
-        response.raise_for_status()
-        return response.json()['choices'][0]['message']['content']
+        except Exception as e:
+            record['error'] = type(e).__name__
+            if raise_errors:
+                raise
+            return f"Unexpected error: {e}"
 
-    except requests.exceptions.RequestException as e:
-        return f"Error communicating with local LLM: {e}"
+        record['tokens'] = usage.get('completion_tokens')
+        record['prompt_tokens'] = usage.get('prompt_tokens')
+
+        # Only successful completions are cached
+        if use_cache:
+            store_response(key, content)
+        return content
+
+def hide_reasoning(deltas):
+    """
+    Filters a stream of text deltas down to the visible answer. A reply that opens
+    with a <think> block is held back until its </think> tag, which may be split
+    across deltas. A reply that does not is passed through as soon as its first
+    characters rule the tag out, so answers without reasoning still stream.
+    Unlike extract_text_after_tag, a reply without the tag is shown, not dropped,
+    and an unterminated reasoning block is emitted when the stream ends.
+    """
+    deltas = iter(deltas)
+    buffer = ""
+    for delta in deltas:
+        buffer += delta
+        head = buffer.lstrip()
+        if head and not head.startswith(THINK_START_TAG) and not THINK_START_TAG.startswith(head):
+            # No reasoning block: everything from here on is the answer
+            yield head
+            yield from deltas
+            return
+        end = buffer.find(THINK_END_TAG)
+        if end != -1:
+            answer = buffer[end + len(THINK_END_TAG):]
+            break
+    else:
+        if buffer.strip():
+            yield buffer.strip()
+        return
+
+    # Drop the whitespace between the tag and the first visible token
+    answer = answer.lstrip()
+    while not answer:
+        answer = next(deltas, None)
+        if answer is None:
+            return
+        answer = answer.lstrip()
+    yield answer
+    yield from deltas
+
+def _stream_deltas(prompt, temperature, stats, client, stop=None):
+    """
+    Yields content deltas from the OpenAI-compatible SSE stream and records timing in `stats`.
+    Setting the `stop` event closes the connection at the next chunk, reasoning included;
+    a stopped stream leaves no "response" in `stats`, so it is never cached.
+    """
+    start = time.perf_counter()
+    tokens = 0
+    raw = []
+    with client.slot():
+        if stop is not None and stop.is_set():
+            stats["stopped"] = True
+            return  # Abandoned while waiting for a slot
+        with client.post(_build_payload(prompt, temperature, stream=True), stream=True) as response:
+            response.encoding = "utf-8"  # SSE is always UTF-8, whatever the Content-Type says
+            for line in response.iter_lines(chunk_size=None, decode_unicode=True):
+                if stop is not None and stop.is_set():
+                    stats["stopped"] = True
+                    return
+                if not line or not line.startswith("data:"):
+                    continue
+                data = line[len("data:"):].strip()
+                if data == "[DONE]":
+                    break
+                chunk = json.loads(data)
+                if chunk.get("usage"):
+                    stats["tokens"] = chunk["usage"].get("completion_tokens", tokens)
+                    stats["prompt_tokens"] = chunk["usage"].get("prompt_tokens")
+                if not chunk.get("choices"):
+                    continue
+                delta = chunk["choices"][0].get("delta", {}).get("content")
+                if not delta:
+                    continue
+                if tokens == 0:
+                    stats["time_to_first_token"] = time.perf_counter() - start
+                tokens += 1  # LM Studio sends one token per chunk
+                raw.append(delta)
+                yield delta
+
+    elapsed = time.perf_counter() - start
+    stats.setdefault("tokens", tokens)
+    stats["total_seconds"] = elapsed
+    generation_seconds = elapsed - stats.get("time_to_first_token", 0.0)
+    stats["tokens_per_second"] = stats["tokens"] / generation_seconds if generation_seconds > 0 else 0.0
+    stats["response"] = "".join(raw)
+
+def stream_local_llm(prompt, temperature=TEMPERATURE, use_cache=True, refresh=False, stats=None, client=None,
+                     stop=None):
+    """
+    Streaming variant of ask_local_llm. Yields the visible answer as it is generated,
+    hiding the <think> reasoning block on the fly. Timing is written into `stats`:
+    time_to_first_token, tokens, tokens_per_second and total_seconds (or cached=True).
+    Setting the `stop` event abandons the request.
+    """
+    stats = {} if stats is None else stats
+    with span('llm.stream', prompt_chars=len(prompt)) as record:
+        key = cache_key(MODEL_NAME, SYSTEM_PROMPT, prompt, temperature)
+        if use_cache and not refresh:
+            cached = get_cached_response(key)
+            if cached is not None:
+                stats["cached"] = record["cached"] = True
+                yield from hide_reasoning([cached])
+                return
 
-    except Exception as e:
-        return f"Unexpected error: {e}"
+        try:
+            yield from hide_reasoning(_stream_deltas(prompt, temperature, stats, client or get_client(), stop))
+        except requests.exceptions.RequestException as e:
+            record["error"] = type(e).__name__
+            yield f"Error communicating with local LLM: {e}"
+            return
+        except Exception as e:
+            record["error"] = type(e).__name__
+            yield f"Unexpected error: {e}"
+            return
+        finally:
+            record["tokens"] = stats.get("tokens")
+            record["prompt_tokens"] = stats.get("prompt_tokens")
+            record["time_to_first_token"] = stats.get("time_to_first_token")
+            record["stopped"] = stats.get("stopped")
 
+        # Only complete, successful streams are cached
+        response = stats.pop("response", None)
+        if use_cache and response is not None:
+            store_response(key, response)
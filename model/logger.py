@@ -1,67 +1,298 @@
-import sqlite3
+import pandas as pd
+import sys
 from datetime import datetime
 import re
-from parser.csv_parser import parse_csv_file  # Updated import
-
-def log_workout(file, stats, workout_type):
-    conn = sqlite3.connect('data/workout_log.db')
-    cursor = conn.cursor()
-
-    # Ensure table has required columns
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS workouts (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT,
-        file_name TEXT,
-        workout_type TEXT,
-        total_distance REAL,
-        duration_min REAL,
-        avg_heart_rate INTEGER,
-        avg_cadence INTEGER,
-        avg_power INTEGER,
-        avg_elevation INTEGER,
-        elevation_gain INTEGER,
-        total_calories INTEGER
-    )
-    ''')
-    
-    # Extract date from filename using regex
-    file_name = str(file.name)
+from parser.sample_cache import content_hash
+from model.storage import connect, transaction, WORKOUT_COLUMNS
+from model.rollups import add_workout, rebuild_rollups
+from model.training_load import add_load, backfill_from, rebuild_training_load, form_on
+from utils.timing import span
+
+INSERT_WORKOUT_SQL = """
+INSERT INTO workouts (
+    date, file_name, workout_type, total_distance, duration_min,
+    avg_heart_rate, avg_cadence, avg_power, avg_elevation,
+    elevation_gain, total_calories, training_load,
+    min_latitude, min_longitude, max_latitude, max_longitude, content_hash
+) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (content_hash, date) DO UPDATE SET
+    file_name = excluded.file_name,
+    workout_type = excluded.workout_type,
+    total_distance = excluded.total_distance,
+    duration_min = excluded.duration_min,
+    avg_heart_rate = excluded.avg_heart_rate,
+    avg_cadence = excluded.avg_cadence,
+    avg_power = excluded.avg_power,
+    avg_elevation = excluded.avg_elevation,
+    elevation_gain = excluded.elevation_gain,
+    total_calories = excluded.total_calories,
+    training_load = excluded.training_load,
+    min_latitude = excluded.min_latitude,
+    min_longitude = excluded.min_longitude,
+    max_latitude = excluded.max_latitude,
+    max_longitude = excluded.max_longitude
+"""
+
+UPSERT_TRACK_SQL = """
+INSERT OR REPLACE INTO workout_tracks (content_hash, date, points, track) VALUES (?, ?, ?, ?)
+"""
+
+SELECT_WORKOUTS_SQL = "SELECT * FROM workouts ORDER BY date DESC"
+
+# Columns the paginated log view may show (the id and date are always read for the cursor)
+LOG_VIEW_COLUMNS = [name for name in WORKOUT_COLUMNS if name != 'content_hash']
+DEFAULT_LOG_COLUMNS = ['date', 'workout_type', 'total_distance', 'duration_min', 'avg_heart_rate', 'total_calories', 'training_load']
+LOG_PAGE_SIZE = 50
+
+SELECT_LOGGED_ROW_SQL = """
+SELECT date, workout_type, total_distance, duration_min, total_calories, training_load
+FROM workouts WHERE content_hash = ? AND date = ?
+"""
+
+SELECT_ROLLUP_SQL = """
+SELECT bucket, SUM(workouts) AS workouts, SUM(distance) AS distance,
+       SUM(duration) AS duration, SUM(calories) AS calories
+FROM workout_rollups WHERE period = ?
+GROUP BY bucket ORDER BY bucket
+"""
+
+SELECT_TYPE_COUNTS_SQL = """
+SELECT workout_type, SUM(workouts) AS workouts
+FROM workout_rollups WHERE period = 'month' AND workout_type != ''
+GROUP BY workout_type ORDER BY workouts DESC
+"""
+
+def fetch_workout_log(db_path=None):
+    with connect(db_path) as conn:
+        return pd.read_sql(SELECT_WORKOUTS_SQL, conn)
+
+def _log_filters(start_date, end_date, workout_types, date_column='date', type_column='workout_type'):
+    clauses, params = [], []
+    if start_date:
+        clauses.append(f"{date_column} >= ?")
+        params.append(str(start_date))
+    if end_date:
+        clauses.append(f"{date_column} <= ?")
+        params.append(str(end_date))
+    if workout_types:
+        clauses.append(f"{type_column} IN ({', '.join('?' * len(workout_types))})")
+        params += list(workout_types)
+    return clauses, params
+
+def fetch_workout_page(columns=DEFAULT_LOG_COLUMNS, start_date=None, end_date=None, workout_types=None,
+                       after=None, page_size=LOG_PAGE_SIZE, db_path=None):
+    """
+    Returns one page of the workout log, newest first, and the cursor of the next page
+    (None on the last one). Filters, ordering and paging all run in SQLite, and only
+    `columns` are read. `after` is the (date, id) of the previous page's last row, so
+    every page is a range scan on the date index, however deep into the log it is.
+    """
+    unknown = [name for name in columns if name not in LOG_VIEW_COLUMNS]
+    if unknown:
+        raise ValueError(f"Unknown workout log columns: {unknown}")
+    clauses, params = _log_filters(start_date, end_date, workout_types)
+    if after is not None:
+        clauses.append("(date, id) < (?, ?)")
+        params += list(after)
+    selected = ['id', 'date'] + [name for name in columns if name != 'date']
+    where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+    sql = f"SELECT {', '.join(selected)} FROM workouts {where} ORDER BY date DESC, id DESC LIMIT ?"
+    with connect(db_path) as conn:
+        page = pd.read_sql(sql, conn, params=params + [page_size + 1])  # One extra row tells if there is a next page
+
+    next_cursor = None
+    if len(page) > page_size:
+        page = page.iloc[:page_size]
+        next_cursor = (page['date'].iloc[-1], int(page['id'].iloc[-1]))
+    return page[list(columns)], next_cursor
+
+def fetch_workout_count(start_date=None, end_date=None, workout_types=None, db_path=None):
+    """
+    Counts the workouts matching the log view filters from the daily rollups, without touching the workouts table.
+    """
+    clauses, params = _log_filters(start_date, end_date, workout_types, date_column='bucket')
+    where = ''.join(f" AND {clause}" for clause in clauses)
+    with connect(db_path) as conn:
+        row = conn.execute(f"SELECT SUM(workouts) FROM workout_rollups WHERE period = 'day'{where}", params).fetchone()
+    return int(row[0] or 0)
+
+def fetch_log_version(db_path=None):
+    """
+    Returns a counter that changes whenever the workouts table changes.
+    """
+    with connect(db_path) as conn:
+        return conn.execute("SELECT version FROM log_version WHERE id = 1").fetchone()[0]
+
+def fetch_rollup(period, db_path=None):
+    """
+    Returns per-bucket workout counts, distance, duration and calories for
+    period 'day', 'week' or 'month', summed over workout types.
+    """
+    with connect(db_path) as conn:
+        return pd.read_sql(SELECT_ROLLUP_SQL, conn, params=(period,))
+
+def fetch_workout_type_counts(db_path=None):
+    """
+    Returns the number of logged sessions per workout type as a Series.
+    """
+    with connect(db_path) as conn:
+        counts = pd.read_sql(SELECT_TYPE_COUNTS_SQL, conn)
+    return counts.set_index('workout_type')['workouts']
+
+def fetch_training_form(day=None, db_path=None):
+    """
+    Returns today's (or `day`'s) CTL, ATL and TSB from the training load series, or None.
+    """
+    with connect(db_path) as conn:
+        return form_on(conn, day)
+
+def workout_date_from_name(file_name, fallback=None):
+    # Extract date from filename using regex, else use `fallback` (e.g. the first sample's date), else today
     date_match = re.search(r'\d{4}-\d{2}-\d{2}', file_name)
-    extracted_date = date_match.group(0) if date_match else datetime.now().strftime("%Y-%m-%d")
+    if date_match:
+        return date_match.group(0)
+    return fallback or datetime.now().strftime("%Y-%m-%d")
 
+def workout_row(file_name, stats, workout_type, file_hash, training_load=None, workout_date=None):
+    """
+    Builds the INSERT_WORKOUT_SQL parameters for one analysed workout.
+    `training_load` is its TSS-like load; when None the duration-based estimate is used.
+    `workout_date` is the date it is logged (and upserted) under; without one it comes
+    from the file name. Pass it whenever the name may not hold a date, so the same file
+    logged on another day still updates its row.
+    """
     # Safely access and default stat values
     def safe_stat(key):
         return stats.get(key) if stats.get(key) is not None else 0
 
-    total_distance = stats.get("total_distance")
-    duration_min = stats.get("workout_duration")
-    avg_heart_rate = stats.get("avg_heart_rate")
-    avg_cadence = safe_stat("avg_cadence")
-    avg_power = safe_stat("avg_power")
-    avg_elevation = safe_stat("avg_elevation")
-    elevation_gain = safe_stat("elevation_gain")
-    total_calories = safe_stat("total_calories")
-
-    # Insert workout data into the database
-    cursor.execute("""
-    INSERT INTO workouts (
-        date, file_name, workout_type, total_distance, duration_min,
-        avg_heart_rate, avg_cadence, avg_power, avg_elevation,
-        elevation_gain, total_calories
-    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-    """, (
-        extracted_date,
+    return (
+        workout_date or workout_date_from_name(file_name),
         file_name,
         workout_type,
-        total_distance,
-        duration_min,
-        avg_heart_rate,
-        avg_cadence,
-        avg_power,
-        avg_elevation,
-        elevation_gain,
-        total_calories,
-    ))
-    conn.commit()
-    conn.close()
\ No newline at end of file
+        stats.get("total_distance"),
+        stats.get("workout_duration"),
+        stats.get("avg_heart_rate"),
+        safe_stat("avg_cadence"),
+        safe_stat("avg_power"),
+        safe_stat("avg_elevation"),
+        safe_stat("elevation_gain"),
+        safe_stat("total_calories"),
+        training_load,
+        stats.get("min_latitude"),
+        stats.get("min_longitude"),
+        stats.get("max_latitude"),
+        stats.get("max_longitude"),
+        file_hash,
+    )
+
+def log_workout(file, stats, workout_type, file_hash=None, db_path=None, training_load=None, track=None, workout_date=None):
+    """
+    Inserts a workout, or updates it if the same file was already logged for the same date.
+    `track` is its simplified GPS track from utils.track.track_blob(), if any, and
+    `workout_date` the date to log it under (see workout_row).
+    Safe to call on every Streamlit rerun.
+    """
+    if file_hash is None:
+        file_hash = content_hash(file)
+    row = workout_row(str(file.name), stats, workout_type, file_hash, training_load, workout_date)
+
+    # Insert workout data into the database, or refresh the existing row for this file and date
+    with span('log_workout', rows=1), transaction(db_path) as conn:
+        _update_rollups(conn, row)
+        conn.execute(INSERT_WORKOUT_SQL, row)
+        if track is not None:
+            conn.execute(UPSERT_TRACK_SQL, _track_row(row, track))
+
+def log_workouts(rows, db_path=None, tracks=None):
+    """
+    Upserts many workout_row() tuples in a single transaction.
+    `tracks` optionally maps (content_hash, date) to a track_blob().
+    """
+    # Keep the last row per (content_hash, date) so each rollup update sees the stored state
+    rows = list({(row[-1], row[0]): row for row in rows}.values())
+    with span('log_workouts', rows=len(rows)), transaction(db_path) as conn:
+        touched = [_update_rollups(conn, row, backfill=False) for row in rows]
+        touched = [day for day in touched if day is not None]
+        if touched:
+            backfill_from(conn, min(touched))  # One pass over the training load series
+        conn.executemany(INSERT_WORKOUT_SQL, rows)
+        if tracks:
+            conn.executemany(UPSERT_TRACK_SQL, [
+                _track_row(row, tracks[(row[-1], row[0])]) for row in rows
+                if tracks.get((row[-1], row[0])) is not None
+            ])
+
+def _track_row(row, track):
+    return (row[-1], row[0], len(track) // 16, track)  # Two float64 per point
+
+def _update_rollups(conn, row, backfill=True):
+    # Replace the contribution of the row being overwritten, if any, with the new one,
+    # in both the calendar rollups and the training load series
+    workout_date, workout_type, total_distance, duration_min, total_calories = row[0], row[2], row[3], row[4], row[10]
+    previous = conn.execute(SELECT_LOGGED_ROW_SQL, (row[-1], workout_date)).fetchone()
+    days = []
+    if previous:
+        add_workout(conn, *previous[:5], sign=-1)
+        days.append(add_load(conn, previous[0], previous[5], previous[3], sign=-1, backfill=backfill))
+    add_workout(conn, workout_date, workout_type, total_distance, duration_min, total_calories)
+    days.append(add_load(conn, workout_date, row[11], duration_min, backfill=backfill))
+    # Earliest training load day touched, for callers that backfill later
+    days = [day for day in days if day is not None]
+    return min(days) if days else None
+
+def fetch_logged_hashes(db_path=None):
+    """
+    Returns the content hashes of every workout already in the log.
+    """
+    with connect(db_path) as conn:
+        return {row[0] for row in conn.execute("SELECT content_hash FROM workouts WHERE content_hash IS NOT NULL")}
+
+def collapse_duplicate_workouts(db_path=None):
+    """
+    One-shot cleanup for databases filled before log_workout became idempotent.
+    Rows logged without a content hash are collapsed per file name and date,
+    keeping the most recent one (or the hashed row, when one exists).
+    Returns the number of rows removed.
+    """
+    with transaction(db_path) as conn:
+        removed = _collapse_duplicates(conn)
+        rebuild_rollups(conn)
+        rebuild_training_load(conn)
+    with connect(db_path) as conn:
+        conn.execute("VACUUM")
+    return removed
+
+def _collapse_duplicates(conn):
+    # Legacy rows that duplicate a row logged with a content hash
+    cursor = conn.execute('''
+    DELETE FROM workouts
+    WHERE content_hash IS NULL
+      AND EXISTS (
+        SELECT 1 FROM workouts AS hashed
+        WHERE hashed.content_hash IS NOT NULL
+          AND hashed.file_name = workouts.file_name
+          AND hashed.date = workouts.date
+      )
+    ''')
+    removed = cursor.rowcount
+
+    # Legacy rows that duplicate each other
+    cursor = conn.execute('''
+    DELETE FROM workouts
+    WHERE content_hash IS NULL
+      AND id NOT IN (
+        SELECT MAX(id) FROM workouts
+        WHERE content_hash IS NULL
+        GROUP BY file_name, date
+      )
+    ''')
+    removed += cursor.rowcount
+    return removed
+
+if __name__ == "__main__":
+    # Usage: python -m model.logger dedupe [path/to/workout_log.db]
+    if len(sys.argv) >= 2 and sys.argv[1] == "dedupe":
+        removed = collapse_duplicate_workouts(*sys.argv[2:3])
+        print(f"Removed {removed} duplicate workout rows.")
+    else:
+        print("Usage: python -m model.logger dedupe [db_path]")
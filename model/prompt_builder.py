@@ -0,0 +1,145 @@
+from datetime import date as Date, timedelta
+from model.storage import connect
+from model.training_load import form_on
+
+CHARS_PER_TOKEN = 4  # Rough estimate for English text and numbers; no tokenizer needed
+PROMPT_TOKEN_BUDGET = 600  # Hard cap for the user message (the system prompt is sent separately)
+DIGEST_WEEKS = 8
+DIGEST_SESSIONS = 10
+MAX_TYPE_CHARS = 18  # Workout type column width in the digest
+MAX_INJURY_CHARS = 200
+
+# Last N sessions before a day; served by idx_workouts_date, so the cost does not grow with the log
+SELECT_RECENT_SESSIONS_SQL = """
+SELECT date, workout_type, total_distance, duration_min, avg_heart_rate, training_load
+FROM workouts
+WHERE date < ?
+ORDER BY date DESC, id DESC
+LIMIT ?
+"""
+
+# Per-week volume (weeks start on Monday) over a bounded date range
+SELECT_WEEKLY_VOLUME_SQL = """
+SELECT date(date, 'weekday 0', '-6 days') AS week, COUNT(*), SUM(total_distance), SUM(duration_min), SUM(training_load)
+FROM workouts
+WHERE date >= ? AND date < ?
+GROUP BY week
+"""
+
+
+def estimate_tokens(text):
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+def _last(rows, n):
+    return rows if n is None else rows[len(rows) - n:]
+
+def _number(value, fmt, width):
+    # Fixed-width number, '-' when missing
+    if value is None:
+        return '-'.rjust(width)
+    return format(value, fmt).rjust(width)
+
+def profile_block(profile):
+    '''
+    The athlete's profile, first in the prompt: it only changes when the sidebar does,
+    so the server can reuse its cached prefix across workouts.
+    '''
+    lines = [
+        "Athlete profile:",
+        f"- {profile['gender']}, {profile['age']} years, {profile['weight_kg']} kg, {profile['height_cm']} cm",
+        f"- level: {profile['fitness_level']}; goal: {profile['fitness_goal']}; focus: {profile['target_focus']}",
+        f"- prefers: {profile['workout_preference']}; available {profile['weekly_availability']} days/week, "
+        f"{profile['time_per_session']} min/session",
+    ]
+    if profile.get('has_injury'):
+        lines.append(f"- injury or limitation: {profile['has_injury'][:MAX_INJURY_CHARS]}")
+    return '\n'.join(lines)
+
+def fetch_history(before, db_path=None, weeks=DIGEST_WEEKS, sessions=DIGEST_SESSIONS):
+    '''
+    Reads the history digest inputs for the days before `before` (YYYY-MM-DD):
+    per-week volume for the last `weeks` weeks, the last `sessions` sessions and
+    the training form at the end of the previous day. Every query is bounded, so
+    the cost stays flat however long the log grows.
+    '''
+    end = Date.fromisoformat(before)
+    first_week = end - timedelta(days=end.weekday()) - timedelta(weeks=weeks - 1)
+    with connect(db_path) as conn:
+        recent = conn.execute(SELECT_RECENT_SESSIONS_SQL, (before, sessions)).fetchall()
+        volume = {row[0]: row[1:] for row in conn.execute(SELECT_WEEKLY_VOLUME_SQL, (first_week.isoformat(), before))}
+        form = form_on(conn, (end - timedelta(days=1)).isoformat())
+    # One row per week, empty weeks included, so the digest always has the same shape
+    weekly = []
+    for i in range(weeks if volume or recent else 0):
+        week = (first_week + timedelta(weeks=i)).isoformat()
+        weekly.append((week, *volume.get(week, (0, None, None, None))))
+    return {'weekly': weekly, 'sessions': recent[::-1], 'form': form}
+
+def history_digest(history, weeks=None, sessions=None):
+    '''
+    Formats fetch_history() output as compact fixed-width tables, oldest first.
+    `weeks` and `sessions` keep only the most recent rows, for trimming to a budget.
+    '''
+    weekly = _last(history['weekly'], weeks)
+    recent = _last(history['sessions'], sessions)
+    lines = []
+    if weekly:
+        lines.append("Weekly volume (week start, sessions, km, min, load):")
+        for week, count, distance, duration, load in weekly:
+            lines.append(f"{week} {count:2d} {_number(distance and distance / 1000, '.1f', 6)} "
+                         f"{_number(duration, '.0f', 4)} {_number(load, '.0f', 4)}")
+    if recent:
+        lines.append("Last sessions (date, type, km, min, avg HR, load):")
+        for day, workout_type, distance, duration, heart_rate, load in recent:
+            lines.append(f"{day} {(workout_type or 'Other')[:MAX_TYPE_CHARS]:<{MAX_TYPE_CHARS}} "
+                         f"{_number(distance and distance / 1000, '.2f', 6)} {_number(duration, '.0f', 4)} "
+                         f"{_number(heart_rate, '.0f', 3)} {_number(load, '.0f', 4)}")
+    if history['form'] is not None:
+        form = history['form']
+        lines.append(f"Training load the day before: CTL {form['ctl']:.0f}, ATL {form['atl']:.0f}, TSB {form['tsb']:+.0f}")
+    return '\n'.join(lines)
+
+def workout_block(stats, workout_type, workout_date):
+    '''
+    The workout just uploaded, last in the prompt since it changes on every request.
+    '''
+    fields = [
+        ('distance', stats.get('total_distance'), lambda v: f"{v / 1000:.2f} km"),
+        ('duration', stats.get('workout_duration'), lambda v: f"{v:.1f} min"),
+        ('avg HR', stats.get('avg_heart_rate'), lambda v: f"{v:.0f} bpm"),
+        ('cadence', stats.get('avg_cadence'), lambda v: f"{v:.0f} steps/min"),
+        ('power', stats.get('avg_power'), lambda v: f"{v:.0f} W"),
+        ('calories', stats.get('total_calories'), lambda v: f"{v:.0f} kcal"),
+        ('avg elevation', stats.get('avg_elevation'), lambda v: f"{v:.0f} m"),
+        ('elevation gain', stats.get('elevation_gain'), lambda v: f"{v:.0f} m"),
+    ]
+    values = '; '.join(f"{name} {fmt(value)}" for name, value, fmt in fields if value is not None and value == value)
+    return f"This workout ({workout_date}, {workout_type}): {values}\nSuggest the next workout."
+
+def build_prompt(stats, profile, workout_type, workout_date, db_path=None, budget=PROMPT_TOKEN_BUDGET):
+    '''
+    Builds the user message: profile, then the history digest, then the current workout.
+    Stable content comes first so repeat requests share the server's cached prefix, and
+    the prompt is identical on every rerun for the same workout (the digest only covers
+    the days before it). The digest is trimmed, oldest rows first, until the estimated
+    token count fits `budget`.
+    '''
+    head = profile_block(profile)
+    tail = workout_block(stats, workout_type, workout_date)
+    history = fetch_history(workout_date, db_path)
+
+    weeks, sessions = len(history['weekly']), len(history['sessions'])
+    while True:
+        digest = history_digest(history, weeks, sessions)
+        prompt = '\n\n'.join(part for part in (head, digest, tail) if part)
+        if estimate_tokens(prompt) <= budget:
+            return prompt
+        if sessions > 0:
+            sessions -= 1
+        elif weeks > 0:
+            weeks -= 1
+        elif history['form'] is not None:
+            history = dict(history, form=None)
+        else:
+            # Only a tiny budget gets here; keep the instruction at the end
+            return prompt[:max(budget * CHARS_PER_TOKEN - len(tail) - 2, 0)] + '\n\n' + tail
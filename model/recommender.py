@@ -1,60 +1,221 @@
-import sqlite3
-from datetime import datetime
-from parser.csv_parser import parse_csv_file  # Updated import
-from utils.stats_utils import analyze_workout_data, format_stats_for_ai
-from model.llm_handler import ask_local_llm
-from model.logger import log_workout  # Updated import
-
-"""# Initialize SQLite database and create the workouts table if not already created
-def init_db():
-    conn = sqlite3.connect('data/workout_log.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS workouts (
+import argparse
+import os
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from model.storage import connect, transaction
+from model.llm_cache import cache_key
+from model.llm_handler import LLMClient, ask_local_llm, MODEL_NAME, SYSTEM_PROMPT, TEMPERATURE
+from model.llm_handler import CONNECT_TIMEOUT, READ_TIMEOUT, MAX_RETRIES, RETRY_BACKOFF
+
+RECOMMENDATIONS_DB_PATH = os.path.join('data', 'recommendations.db')
+WORKER_CONCURRENCY = 2     # Jobs sent to the model server at once, per worker
+POLL_SECONDS = 0.5
+HEARTBEAT_SECONDS = 10     # A worker that has not polled for this long is considered gone
+# Longest one attempt can legitimately take: every try LLMClient.post makes, plus its backoff
+MAX_ATTEMPT_SECONDS = (MAX_RETRIES + 1) * (CONNECT_TIMEOUT + READ_TIMEOUT) + RETRY_BACKOFF * (2 ** MAX_RETRIES - 1)
+STALE_JOB_SECONDS = MAX_ATTEMPT_SECONDS + 60  # Running jobs older than this belonged to a worker that hung
+MAX_ATTEMPTS = 3           # Attempts in total, so a failed job is retried twice
+RETRY_DELAY_SECONDS = 30   # Before a failed attempt is retried, doubled after every attempt
+KEEP_FINISHED_DAYS = 30
+
+
+def _create_recommendations_table(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS recommendations (
         id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT,
-        file_name TEXT,
-        total_distance REAL,
-        duration_min REAL,
-        avg_heart_rate INTEGER,
-        avg_cadence INTEGER,
-        avg_power INTEGER,
-        avg_elevation INTEGER,
-        elevation_gain INTEGER,
-        total_calories INTEGER
+        prompt_hash TEXT NOT NULL UNIQUE,
+        prompt TEXT NOT NULL,
+        status TEXT NOT NULL DEFAULT 'pending',
+        refresh INTEGER NOT NULL DEFAULT 0,
+        result TEXT,
+        error TEXT,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        worker TEXT,
+        created_at REAL NOT NULL,
+        started_at REAL,
+        finished_at REAL,
+        duration REAL
     )
     ''')
-    conn.commit()
-    conn.close()
+    # Workers look for the oldest pending job on every poll
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_recommendations_status ON recommendations (status, id)")
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS recommendation_workers (
+        worker TEXT PRIMARY KEY,
+        last_seen REAL NOT NULL
+    )
+    ''')
+
+def _add_retry_delay(conn):
+    # Failed attempts wait until `not_before` before a worker may claim them again
+    conn.execute("ALTER TABLE recommendations ADD COLUMN not_before REAL NOT NULL DEFAULT 0")
+
+RECOMMENDATION_MIGRATIONS = [
+    _create_recommendations_table,
+    _add_retry_delay,
+]
+
+# Re-queues the job when it is asked for again with refresh, or after it failed
+ENQUEUE_SQL = """
+INSERT INTO recommendations (prompt_hash, prompt, refresh, created_at) VALUES (?, ?, ?, ?)
+ON CONFLICT (prompt_hash) DO UPDATE SET
+    status = 'pending', refresh = excluded.refresh, result = NULL, error = NULL, attempts = 0,
+    created_at = excluded.created_at, started_at = NULL, finished_at = NULL, duration = NULL, not_before = 0
+WHERE excluded.refresh = 1 OR recommendations.status = 'failed'
+"""
+
+# Atomic claim: concurrent workers never get the same job
+CLAIM_SQL = """
+UPDATE recommendations SET status = 'running', started_at = ?, attempts = attempts + 1, worker = ?
+WHERE id IN (SELECT id FROM recommendations WHERE status = 'pending' AND not_before <= ? ORDER BY id LIMIT ?)
+RETURNING id, prompt, refresh, attempts, started_at
+"""
+
+# Only the claim that is still current may finish a job (it may have been re-queued meanwhile)
+FINISH_SQL = """
+UPDATE recommendations SET status = ?, result = ?, error = ?, finished_at = ?, duration = ?, not_before = ?
+WHERE id = ? AND status = 'running' AND started_at = ?
+"""
+
+# Running jobs whose worker stopped polling, or that have run longer than any attempt can, go back to the queue
+REQUEUE_STALE_SQL = """
+UPDATE recommendations SET status = 'pending'
+WHERE status = 'running' AND (
+    started_at < ?
+    OR worker NOT IN (SELECT worker FROM recommendation_workers WHERE last_seen >= ?)
+)
 """
+
+SELECT_JOB_SQL = """
+SELECT id, status, result, error, attempts, created_at, started_at, finished_at, duration
+FROM recommendations WHERE id = ?
 """
-def main():
-    # Initialize DB and ensure the table is there
-    init_db()
+JOB_FIELDS = ['id', 'status', 'result', 'error', 'attempts', 'created_at', 'started_at', 'finished_at', 'duration']
+
+
+def job_key(prompt):
+    """
+    Same key as the LLM response cache, so identical requests share one job.
+    """
+    return cache_key(MODEL_NAME, SYSTEM_PROMPT, prompt, TEMPERATURE)
 
-    # File upload and parsing
-    uploaded_file = input("Enter the path to your CSV file (e.g., data/run1.csv): ").strip()  # Updated prompt
+def enqueue(prompt, refresh=False, db_path=RECOMMENDATIONS_DB_PATH):
+    """
+    Queues a recommendation for `prompt` and returns the job id. A prompt that is
+    already queued, running or done reuses its job; refresh=True asks for a new answer.
+    """
+    with transaction(db_path, RECOMMENDATION_MIGRATIONS) as conn:
+        key = job_key(prompt)
+        conn.execute(ENQUEUE_SQL, (key, prompt, int(refresh), time.time()))
+        return conn.execute("SELECT id FROM recommendations WHERE prompt_hash = ?", (key,)).fetchone()[0]
 
-    if not uploaded_file:
-        print("❌ No file selected.")
-        return
+def fetch_job(job_id, db_path=RECOMMENDATIONS_DB_PATH):
+    """
+    Returns the job as a dict (status is pending, running, done or failed), or None.
+    """
+    with connect(db_path, RECOMMENDATION_MIGRATIONS) as conn:
+        row = conn.execute(SELECT_JOB_SQL, (job_id,)).fetchone()
+    return dict(zip(JOB_FIELDS, row)) if row else None
 
-    workout_data = parse_csv_file(uploaded_file)  # Updated parser function
-    stats = analyze_workout_data(workout_data)
-    
-    # Display workout summary
-    print(f"Workout summary: {stats}")
+def wait_for_job(job_id, timeout=READ_TIMEOUT, poll=POLL_SECONDS, db_path=RECOMMENDATIONS_DB_PATH):
+    """
+    Polls until the job is done or failed, or `timeout` seconds pass, and returns its latest state.
+    """
+    deadline = time.monotonic() + timeout
+    while True:
+        job = fetch_job(job_id, db_path)
+        if job is None or job['status'] in ('done', 'failed') or time.monotonic() >= deadline:
+            return job
+        time.sleep(poll)
 
-    # Generate AI prompt
-    prompt = format_stats_for_ai(stats)
-    
-    # Get workout suggestion from AI
-    suggestion = ask_local_llm(prompt)
-    print("Suggested workout:", suggestion)
+def worker_running(db_path=RECOMMENDATIONS_DB_PATH):
+    """
+    True if a worker has polled the queue within the last HEARTBEAT_SECONDS.
+    """
+    with connect(db_path, RECOMMENDATION_MIGRATIONS) as conn:
+        row = conn.execute("SELECT MAX(last_seen) FROM recommendation_workers").fetchone()
+    return row[0] is not None and time.time() - row[0] < HEARTBEAT_SECONDS
 
-    # Log the workout in SQLite
-    log_workout(uploaded_file, stats)
+def claim_jobs(worker, limit, db_path=RECOMMENDATIONS_DB_PATH):
+    """
+    Marks up to `limit` pending jobs as running for `worker` and returns them
+    as (id, prompt, refresh, attempts, started_at). Also records the worker's heartbeat and
+    re-queues jobs left running by a worker that died or hung.
+    """
+    now = time.time()
+    with transaction(db_path, RECOMMENDATION_MIGRATIONS) as conn:
+        conn.execute("INSERT OR REPLACE INTO recommendation_workers (worker, last_seen) VALUES (?, ?)", (worker, now))
+        conn.execute(REQUEUE_STALE_SQL, (now - STALE_JOB_SECONDS, now - 3 * HEARTBEAT_SECONDS))
+        if limit <= 0:
+            return []
+        return conn.execute(CLAIM_SQL, (now, worker, now, limit)).fetchall()
+
+def run_job(job, client, db_path=RECOMMENDATIONS_DB_PATH):
+    """
+    Asks the model for one claimed job and stores the answer, or the error.
+    A failed job is attempted up to MAX_ATTEMPTS times in total, with a growing delay between attempts.
+    """
+    job_id, prompt, refresh, attempts, started_at = job
+    start = time.perf_counter()
+    not_before = 0
+    try:
+        result = ask_local_llm(prompt, refresh=bool(refresh), client=client, raise_errors=True)
+        status, error = 'done', None
+    except Exception as e:
+        result, error = None, f"{type(e).__name__}: {e}"
+        status = 'failed' if attempts >= MAX_ATTEMPTS else 'pending'
+        not_before = time.time() + RETRY_DELAY_SECONDS * 2 ** (attempts - 1)
+    duration = time.perf_counter() - start
+    with transaction(db_path, RECOMMENDATION_MIGRATIONS) as conn:
+        conn.execute(FINISH_SQL, (status, result, error, time.time(), duration, not_before, job_id, started_at))
+    return status
+
+def _report(job_id, future):
+    # Done callback: never re-raise here, the executor would only log it as a callback error
+    error = future.exception()
+    print(f"Job {job_id}: {future.result() if error is None else f'crashed ({type(error).__name__}: {error})'}",
+          flush=True)
+
+def purge_finished(days=KEEP_FINISHED_DAYS, db_path=RECOMMENDATIONS_DB_PATH):
+    with transaction(db_path, RECOMMENDATION_MIGRATIONS) as conn:
+        conn.execute("DELETE FROM recommendations WHERE status IN ('done', 'failed') AND finished_at < ?",
+                     (time.time() - days * 86400,))
+        conn.execute("DELETE FROM recommendation_workers WHERE last_seen < ?", (time.time() - days * 86400,))
+
+def run_worker(concurrency=WORKER_CONCURRENCY, poll=POLL_SECONDS, once=False, db_path=RECOMMENDATIONS_DB_PATH):
+    """
+    Pulls pending jobs and runs at most `concurrency` of them at a time against the
+    local model server. With once=True, returns when the queue is empty.
+    """
+    worker = f"{socket.gethostname()}:{os.getpid()}"
+    client = LLMClient(max_concurrency=concurrency)
+    purge_finished(db_path=db_path)
+    in_flight = set()
+    print(f"Recommendation worker {worker} running ({concurrency} at a time), queue: {db_path}", flush=True)
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="recommendation") as executor:
+        try:
+            while True:
+                in_flight = {future for future in in_flight if not future.done()}
+                jobs = claim_jobs(worker, concurrency - len(in_flight), db_path)
+                for job in jobs:
+                    print(f"Job {job[0]}: started (attempt {job[3]})", flush=True)
+                    future = executor.submit(run_job, job, client, db_path)
+                    future.add_done_callback(lambda f, job_id=job[0]: _report(job_id, f))
+                    in_flight.add(future)
+                if once and not jobs and not in_flight:
+                    break
+                time.sleep(min(poll, HEARTBEAT_SECONDS / 2))  # Polling is the heartbeat that keeps our jobs ours
+        except KeyboardInterrupt:
+            print("Stopping after the running jobs finish (interrupt again to abandon them; they will be re-queued).")
+    client.close()
 
 if __name__ == "__main__":
-    main()
-"""
\ No newline at end of file
+    arg_parser = argparse.ArgumentParser(description="Run the background worker that answers queued workout recommendations.")
+    arg_parser.add_argument("--concurrency", type=int, default=WORKER_CONCURRENCY, help="Requests sent to the model at once")
+    arg_parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="Seconds between queue checks")
+    arg_parser.add_argument("--once", action="store_true", help="Exit when the queue is empty")
+    arg_parser.add_argument("--db", default=RECOMMENDATIONS_DB_PATH, help="Queue database path (default: data/recommendations.db)")
+    args = arg_parser.parse_args()
+
+    run_worker(args.concurrency, args.poll, args.once, args.db)
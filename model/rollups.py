@@ -0,0 +1,64 @@
+from datetime import date as Date
+
+# Calendar granularities kept in workout_rollups, with the bucket label for a YYYY-MM-DD date
+PERIODS = {
+    'day': lambda d: d.isoformat(),
+    'week': lambda d: '{}-W{:02d}'.format(*d.isocalendar()[:2]),
+    'month': lambda d: d.strftime('%Y-%m'),
+}
+
+CREATE_ROLLUPS_SQL = '''
+CREATE TABLE IF NOT EXISTS workout_rollups (
+    period TEXT NOT NULL,
+    bucket TEXT NOT NULL,
+    workout_type TEXT NOT NULL,
+    workouts INTEGER NOT NULL,
+    distance REAL NOT NULL,
+    duration REAL NOT NULL,
+    calories REAL NOT NULL,
+    PRIMARY KEY (period, bucket, workout_type)
+) WITHOUT ROWID
+'''
+
+UPSERT_ROLLUP_SQL = '''
+INSERT INTO workout_rollups (period, bucket, workout_type, workouts, distance, duration, calories)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (period, bucket, workout_type) DO UPDATE SET
+    workouts = workouts + excluded.workouts,
+    distance = distance + excluded.distance,
+    duration = duration + excluded.duration,
+    calories = calories + excluded.calories
+'''
+
+def _number(value):
+    # NULL and NaN stats count as zero so they never poison the running sums
+    if value is None or value != value:
+        return 0.0
+    return float(value)
+
+def add_workout(conn, workout_date, workout_type, distance, duration, calories, sign=1):
+    """
+    Adds (sign=1) or removes (sign=-1) one workout from every rollup bucket it falls in.
+    Must run inside the caller's write transaction.
+    """
+    try:
+        day = Date.fromisoformat(str(workout_date))
+    except ValueError:
+        return  # Undated rows cannot be bucketed
+
+    values = (sign, sign * _number(distance), sign * _number(duration), sign * _number(calories))
+    conn.executemany(UPSERT_ROLLUP_SQL, [
+        (period, label(day), workout_type or '') + values
+        for period, label in PERIODS.items()
+    ])
+    if sign < 0:
+        conn.execute("DELETE FROM workout_rollups WHERE workouts <= 0")
+
+def rebuild_rollups(conn):
+    """
+    Recomputes every rollup from the workouts table, e.g. after rows were deleted.
+    """
+    conn.execute("DELETE FROM workout_rollups")
+    rows = conn.execute("SELECT date, workout_type, total_distance, duration_min, total_calories FROM workouts")
+    for row in rows.fetchall():
+        add_workout(conn, *row)
@@ -0,0 +1,226 @@
+import os
+import queue
+import re
+import sqlite3
+import threading
+from contextlib import contextmanager
+from model.rollups import CREATE_ROLLUPS_SQL, rebuild_rollups
+from model.training_load import CREATE_TRAINING_LOAD_SQL, rebuild_training_load
+
+DB_PATH = os.path.join('data', 'workout_log.db')
+
+# Every athlete has a database file of their own, so their queries never touch other
+# athletes' rows and writers for different athletes never wait on the same lock.
+# The default athlete keeps the original single-user database.
+DEFAULT_ATHLETE = 'default'
+ATHLETES_DIR = os.path.join('data', 'athletes')
+ATHLETE_ID_PATTERN = re.compile(r'[A-Za-z0-9][A-Za-z0-9_.-]{0,63}')
+
+# Columns every workouts table must have, including ones added after the first release
+WORKOUT_COLUMNS = {
+    'date': 'TEXT',
+    'file_name': 'TEXT',
+    'workout_type': 'TEXT',
+    'total_distance': 'REAL',
+    'duration_min': 'REAL',
+    'avg_heart_rate': 'INTEGER',
+    'avg_cadence': 'INTEGER',
+    'avg_power': 'INTEGER',
+    'avg_elevation': 'INTEGER',
+    'elevation_gain': 'INTEGER',
+    'total_calories': 'INTEGER',
+    'content_hash': 'TEXT',
+    'training_load': 'REAL',
+    'min_latitude': 'REAL',
+    'min_longitude': 'REAL',
+    'max_latitude': 'REAL',
+    'max_longitude': 'REAL',
+}
+
+_pools = {}
+_migrated = set()
+_lock = threading.Lock()
+
+
+def _create_workouts(conn):
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS workouts (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT,
+        file_name TEXT
+    )
+    ''')
+
+def _add_missing_workout_columns(conn):
+    # Older databases miss avg_cadence, workout_type, content_hash, ...
+    existing = {row[1] for row in conn.execute("PRAGMA table_info(workouts)")}
+    for name, sql_type in WORKOUT_COLUMNS.items():
+        if name not in existing:
+            conn.execute(f"ALTER TABLE workouts ADD COLUMN {name} {sql_type}")
+
+def _add_workout_indexes(conn):
+    conn.execute('''
+    CREATE UNIQUE INDEX IF NOT EXISTS idx_workouts_content_hash_date
+    ON workouts (content_hash, date)
+    ''')
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_date ON workouts (date)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_workout_type ON workouts (workout_type)")
+
+def _create_rollups(conn):
+    conn.execute(CREATE_ROLLUPS_SQL)
+    rebuild_rollups(conn)
+
+def _add_log_version(conn):
+    # Bumped by triggers on every change to workouts, so caches can key on it
+    conn.execute("CREATE TABLE IF NOT EXISTS log_version (id INTEGER PRIMARY KEY CHECK (id = 1), version INTEGER NOT NULL)")
+    conn.execute("INSERT OR IGNORE INTO log_version (id, version) VALUES (1, 0)")
+    for event in ['INSERT', 'UPDATE', 'DELETE']:
+        conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS workouts_version_{event.lower()} AFTER {event} ON workouts
+        BEGIN
+            UPDATE log_version SET version = version + 1 WHERE id = 1;
+        END
+        ''')
+
+def _create_training_load(conn):
+    _add_missing_workout_columns(conn)  # training_load column
+    conn.execute(CREATE_TRAINING_LOAD_SQL)
+    rebuild_training_load(conn)
+
+def _create_workout_tracks(conn):
+    _add_missing_workout_columns(conn)  # Bounding box columns
+    # Simplified GPS track per workout, packed by utils.track.encode_track
+    conn.execute('''
+    CREATE TABLE IF NOT EXISTS workout_tracks (
+        content_hash TEXT NOT NULL,
+        date TEXT NOT NULL,
+        points INTEGER NOT NULL,
+        track BLOB NOT NULL,
+        PRIMARY KEY (content_hash, date)
+    ) WITHOUT ROWID
+    ''')
+
+def _add_log_view_index(conn):
+    # Type-filtered log pages walk (workout_type, date) in order; it also covers the old type index
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_workouts_type_date ON workouts (workout_type, date)")
+    conn.execute("DROP INDEX IF EXISTS idx_workouts_workout_type")
+
+# Schema migrations, applied in order. The database's PRAGMA user_version is the
+# number of migrations already applied, so only append to this list.
+MIGRATIONS = [
+    _create_workouts,
+    _add_missing_workout_columns,
+    _add_workout_indexes,
+    _create_rollups,
+    _add_log_version,
+    _create_training_load,
+    _create_workout_tracks,
+    _add_log_view_index,
+]
+
+
+def migrate(conn, migrations=MIGRATIONS):
+    """
+    Applies any pending migrations, each in its own write transaction.
+    """
+    while True:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+            if version >= len(migrations):
+                conn.execute("COMMIT")
+                return
+            migrations[version](conn)
+            conn.execute(f"PRAGMA user_version = {version + 1}")
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+def _open(db_path):
+    directory = os.path.dirname(db_path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    # Autocommit mode: transactions are opened explicitly by transaction()
+    conn = sqlite3.connect(
+        db_path,
+        timeout=30,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=256,
+    )
+    # WAL lets readers in other sessions proceed while a write is in progress
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    return conn
+
+@contextmanager
+def connect(db_path=None, migrations=MIGRATIONS):
+    """
+    Borrows a long-lived connection from this process's pool for `db_path`.
+    Each connection is used by one thread at a time and returned to the pool
+    afterwards, so repeated statements reuse their prepared form.
+    Databases other than the workout log pass their own `migrations` list.
+    """
+    db_path = db_path or DB_PATH
+    with _lock:
+        pool = _pools.setdefault(db_path, queue.SimpleQueue())
+    try:
+        conn = pool.get_nowait()
+    except queue.Empty:
+        conn = _open(db_path)
+        with _lock:
+            needs_migration = db_path not in _migrated
+        if needs_migration:
+            migrate(conn, migrations)
+            with _lock:
+                _migrated.add(db_path)
+    try:
+        yield conn
+    finally:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        pool.put(conn)
+
+@contextmanager
+def transaction(db_path=None, migrations=MIGRATIONS):
+    """
+    Runs the block in a single write transaction, committed on success and rolled back on error.
+    """
+    with connect(db_path, migrations) as conn:
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+def athlete_db_path(athlete_id=None):
+    """
+    Returns the workout log database of an athlete: DB_PATH for the default athlete,
+    data/athletes/<athlete_id>/workout_log.db for everyone else.
+    """
+    if athlete_id is None or athlete_id == DEFAULT_ATHLETE:
+        return DB_PATH
+    if not ATHLETE_ID_PATTERN.fullmatch(athlete_id):
+        raise ValueError(f"Invalid athlete id {athlete_id!r}: use letters, digits, '.', '_' or '-'")
+    return os.path.join(ATHLETES_DIR, athlete_id, 'workout_log.db')
+
+def list_athletes():
+    """
+    Returns the default athlete followed by every athlete with a database, sorted.
+    """
+    athletes = []
+    if os.path.isdir(ATHLETES_DIR):
+        athletes = sorted(name for name in os.listdir(ATHLETES_DIR)
+                          if ATHLETE_ID_PATTERN.fullmatch(name) and name != DEFAULT_ATHLETE
+                          and os.path.exists(os.path.join(ATHLETES_DIR, name, 'workout_log.db')))
+    return [DEFAULT_ATHLETE] + athletes
+
+def init_db(db_path=None):
+    """
+    Creates the database and brings its schema up to date.
+    """
+    with connect(db_path):
+        pass
@@ -0,0 +1,119 @@
+from datetime import date as Date
+
+CTL_DAYS = 42  # Chronic training load ("fitness") time constant
+ATL_DAYS = 7   # Acute training load ("fatigue") time constant
+CTL_DECAY = 1 - 1 / CTL_DAYS
+ATL_DECAY = 1 - 1 / ATL_DAYS
+LOAD_PER_HOUR = 50  # Fallback load for workouts without power or heart rate (an easy hour)
+
+# One row per day with training; rest days are not stored, their decay is applied on read
+CREATE_TRAINING_LOAD_SQL = '''
+CREATE TABLE IF NOT EXISTS training_load (
+    date TEXT PRIMARY KEY,
+    load REAL NOT NULL,
+    ctl REAL NOT NULL,
+    atl REAL NOT NULL
+) WITHOUT ROWID
+'''
+
+def workout_load(training_load, duration_min):
+    """
+    The load a workout adds: its TSS-like training_load, or a duration-based estimate.
+    """
+    if training_load is not None and training_load == training_load:
+        return float(training_load)
+    if duration_min is None or duration_min != duration_min:
+        return 0.0
+    return float(duration_min) / 60 * LOAD_PER_HOUR
+
+def _days_between(earlier, later):
+    return (Date.fromisoformat(later) - Date.fromisoformat(earlier)).days
+
+def _decay(ctl, atl, days):
+    return ctl * CTL_DECAY ** days, atl * ATL_DECAY ** days
+
+def _store_day(conn, day, load):
+    # CTL/ATL of `day` follow from the previous training day alone, so this is O(1)
+    previous = conn.execute(
+        "SELECT date, ctl, atl FROM training_load WHERE date < ? ORDER BY date DESC LIMIT 1", (day,)
+    ).fetchone()
+    ctl, atl = _decay(previous[1], previous[2], _days_between(previous[0], day) - 1) if previous else (0.0, 0.0)
+    ctl += (load - ctl) / CTL_DAYS
+    atl += (load - atl) / ATL_DAYS
+    conn.execute("INSERT OR REPLACE INTO training_load (date, load, ctl, atl) VALUES (?, ?, ?, ?)",
+                 (day, load, ctl, atl))
+
+def backfill_from(conn, day):
+    """
+    Recomputes CTL/ATL for `day` and every later training day, since each depends on the days before it.
+    """
+    rows = conn.execute("SELECT date, load FROM training_load WHERE date >= ? ORDER BY date", (day,)).fetchall()
+    for row_day, load in rows:
+        _store_day(conn, row_day, load)
+
+def add_load(conn, workout_date, training_load, duration_min, sign=1, backfill=True):
+    """
+    Adds (sign=1) or removes (sign=-1) one workout's load on its date and returns that date.
+    A workout on the latest training day (or later) updates a single row; older
+    ones also recompute the days after them. With backfill=False only the daily
+    load is stored and the caller runs backfill_from() once on the earliest
+    returned date, so a batch of old workouts costs one pass instead of one each.
+    Must run inside the caller's write transaction.
+    """
+    try:
+        day = Date.fromisoformat(str(workout_date)).isoformat()
+    except ValueError:
+        return None  # Undated rows have no place in the series
+
+    delta = sign * workout_load(training_load, duration_min)
+    row = conn.execute("SELECT load FROM training_load WHERE date = ?", (day,)).fetchone()
+    if row is None and delta == 0:
+        return None
+    load = (row[0] if row else 0.0) + delta
+
+    if sign < 0 and abs(load) < 1e-9:
+        conn.execute("DELETE FROM training_load WHERE date = ?", (day,))
+    else:
+        conn.execute('''
+        INSERT INTO training_load (date, load, ctl, atl) VALUES (?, ?, 0, 0)
+        ON CONFLICT (date) DO UPDATE SET load = excluded.load
+        ''', (day, load))
+    if backfill:
+        backfill_from(conn, day)  # A single row when `day` is the latest training day
+    return day
+
+def rebuild_training_load(conn):
+    """
+    Recomputes the whole series from the workouts table.
+    """
+    conn.execute("DELETE FROM training_load")
+    daily = {}
+    for workout_date, training_load, duration_min in conn.execute(
+            "SELECT date, training_load, duration_min FROM workouts").fetchall():
+        try:
+            day = Date.fromisoformat(str(workout_date)).isoformat()
+        except ValueError:
+            continue
+        daily[day] = daily.get(day, 0.0) + workout_load(training_load, duration_min)
+    for day in sorted(daily):
+        _store_day(conn, day, daily[day])
+
+def form_on(conn, day=None):
+    """
+    Returns CTL (fitness), ATL (fatigue) and TSB (form = CTL - ATL) at the end of
+    `day` (default today), or None before the first logged workout.
+    """
+    day = day or Date.today().isoformat()
+    row = conn.execute(
+        "SELECT date, load, ctl, atl FROM training_load WHERE date <= ? ORDER BY date DESC LIMIT 1", (day,)
+    ).fetchone()
+    if row is None:
+        return None
+    ctl, atl = _decay(row[2], row[3], _days_between(row[0], day))
+    return {
+        'date': day,
+        'load': row[1] if row[0] == day else 0.0,
+        'ctl': ctl,
+        'atl': atl,
+        'tsb': ctl - atl,
+    }
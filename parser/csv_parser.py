@@ -1,52 +1,267 @@
 import pandas as pd
+from parser.sample_cache import content_hash, load_samples, store_samples
+import importlib.util
+import time
 import re
 
+# Number of bytes read from the top of the file to sniff its dialect
+SNIFF_BYTES = 8192
+
+# Rows per chunk when streaming a file
+CHUNK_ROWS = 50_000
+
+# Sample fields looked up by keyword, in the same order as the output records
+KEYWORD_FIELDS = {
+    'heart_rate': ['hr', 'heart_rate'],
+    'power': ['power'],
+    'cadence': ['cadence'],
+    'elevation': ['elevation'],
+    'distance': ['distance'],
+    'lap': ['lap'],
+    'since_start': ['since_start'],
+}
+
+SAMPLE_COLUMNS = [
+    'timestamp', 'date', 'iso8601', 'heart_rate', 'power', 'cadence',
+    'latitude', 'longitude', 'elevation', 'distance', 'lap', 'since_start',
+]
+
+# Whole cleaned column names read as floats; anything else is left to type inference
+NUMERIC_COLUMNS = ['hr', 'heart_rate', 'power', 'cadence', 'elevation', 'distance',
+                   'lap', 'since_start', 'latitude', 'longitude', 'speed']
+TEXT_COLUMNS = ['date', 'iso8601']
+
+
+def record_parse_info(parse_info, engine, rows, start):
+    # Fills the caller's dict, if any, with the engine used, row count and elapsed seconds
+    if parse_info is not None:
+        parse_info.update({
+            'engine': engine,
+            'rows': rows,
+            'seconds': time.perf_counter() - start,
+        })
+
+def clean_column_name(col):
+    clean_col = col.lower().strip()
+    return re.sub(r'\s*\(.*?\)', '', clean_col)  # Remove parentheses and inside
+
+def column_matches(col, keywords):
+    '''
+    True if a keyword is the whole cleaned column name or one of its words,
+    so 'lap' matches "Lap" and "Lap number" but not "Elapsed time".
+    '''
+    clean_col = clean_column_name(col)
+    words = {re.sub(r'[\s-]+', '_', clean_col)}
+    words.update(re.split(r'[\s/-]+', clean_col))   # Keeps 'heart_rate' in "max heart_rate"
+    words.update(re.split(r'[\s_/-]+', clean_col))  # Finds 'hr' in "avg_hr"
+    return not words.isdisjoint(keywords)
+
 def find_column_value(row, keywords):
     for col in row.index:
-        clean_col = col.lower().strip()
-        clean_col = re.sub(r'\s*\(.*?\)', '', clean_col)  # Remove parentheses and inside
-        for kw in keywords:
-            if kw in clean_col and pd.notna(row[col]):
-                return row[col]
+        if column_matches(col, keywords) and pd.notna(row[col]):
+            return row[col]
     return None
 
-def parse_csv_file(file_path):
+def _read_head(file_path, size):
+    """
+    Reads the first `size` bytes of a path or file-like object without moving its cursor.
+    """
+    if hasattr(file_path, 'read'):
+        position = file_path.tell()
+        file_path.seek(0)  # An upload may already have been read to the end
+        head = file_path.read(size)
+        file_path.seek(position)
+    else:
+        with open(file_path, 'rb') as f:
+            head = f.read(size)
+    if isinstance(head, bytes):
+        head = head.decode('utf-8-sig', errors='replace')
+    return head.lstrip('\ufeff')
+
+def _rewind(file_path):
+    if hasattr(file_path, 'seek'):
+        file_path.seek(0)
+
+def sniff_csv_dialect(file_path, sample_size=SNIFF_BYTES):
+    """
+    Detects the delimiter, decimal mark and header of a workout CSV from its first few KB.
+    Returns a dict with 'delimiter', 'decimal' and 'columns' keys.
+    """
+    head = _read_head(file_path, sample_size)
+    lines = [line for line in head.splitlines() if line.strip()]
+    if not lines:
+        raise ValueError("file is empty")
+
+    header = lines[0]
+    counts = {d: header.count(d) for d in [';', '\t', ',']}
+    delimiter = max(counts, key=counts.get)
+    if counts[delimiter] == 0:
+        delimiter = ';'
+
+    # A comma can only be the decimal mark when it is not the field separator
+    body = '\n'.join(lines[1:])
+    if delimiter != ',' and re.search(r'\d,\d', body):
+        decimal = ','
+    else:
+        decimal = '.'
+
+    columns = [col.strip().strip('"') for col in header.split(delimiter)]
+    return {'delimiter': delimiter, 'decimal': decimal, 'columns': columns}
+
+def _column_dtypes(columns):
+    """
+    Builds an explicit dtype map for the sniffed header so the fast engines skip type inference.
+    """
+    dtypes = {}
+    for col in columns:
+        clean_col = clean_column_name(col)
+        if clean_col in TEXT_COLUMNS:
+            dtypes[col] = object
+        elif re.sub(r'[\s-]+', '_', clean_col) in NUMERIC_COLUMNS:
+            # Whole names only: "Elapsed time" contains 'lap' but holds text like 00:12:31
+            dtypes[col] = 'float64'
+    return dtypes
+
+def _read_fast(file_path, dialect):
+    # pyarrow has no decimal-comma support, so it is only used for dot-decimal files
+    if dialect['decimal'] == '.' and importlib.util.find_spec('pyarrow') is not None:
+        engine = 'pyarrow'
+    else:
+        engine = 'c'
+    df = pd.read_csv(
+        file_path,
+        delimiter=dialect['delimiter'],
+        decimal=dialect['decimal'],
+        dtype=_column_dtypes(dialect['columns']),
+        engine=engine,
+    )
+    return df, engine
+
+def _read_python(file_path, dialect):
+    df = pd.read_csv(
+        file_path,
+        delimiter=dialect['delimiter'],
+        decimal=dialect['decimal'],
+        engine='python',
+        on_bad_lines='skip'
+    )
+    # Same numeric columns as the fast path; a garbled cell ("--") becomes NaN instead of
+    # leaving the whole column as text
+    for col, dtype in _column_dtypes(dialect['columns']).items():
+        if dtype != object and col in df.columns:
+            values = df[col]
+            if values.dtype == object:
+                values = values.astype(str).str.replace(',', '.', regex=False)
+            df[col] = pd.to_numeric(values, errors='coerce')
+    return df
+
+def to_samples(df):
+    """
+    Maps a raw export DataFrame onto the canonical sample columns.
+    Keyword fields take the first non-null value among matching columns, like find_column_value.
+    """
+    df.columns = [col.strip().lower() for col in df.columns]
+    samples = pd.DataFrame(index=df.index)
+    for field in SAMPLE_COLUMNS:
+        if field in KEYWORD_FIELDS:
+            matches = [col for col in df.columns
+                       if column_matches(col, KEYWORD_FIELDS[field])]
+            if not matches:
+                samples[field] = None
+            elif len(matches) == 1:
+                samples[field] = df[matches[0]]
+            else:
+                samples[field] = df[matches].bfill(axis=1).iloc[:, 0]
+        else:
+            samples[field] = df[field] if field in df.columns else None
+    return samples.reset_index(drop=True)
+
+def conform_samples(samples):
+    """
+    Orders a reader's frame by SAMPLE_COLUMNS with float numeric and object text columns,
+    so GPX and FIT samples are interchangeable with CSV ones.
+    """
+    samples = samples.reindex(columns=SAMPLE_COLUMNS)
+    for col in SAMPLE_COLUMNS:
+        if col in TEXT_COLUMNS:
+            samples[col] = samples[col].astype(object)
+        else:
+            samples[col] = pd.to_numeric(samples[col], errors='coerce').astype('float64')
+    return samples
+
+def read_samples(file_path, use_cache=True, parse_info=None):
+    """
+    Reads a workout CSV into a DataFrame with one column per sample field.
+    Uses the C (or pyarrow) engine with explicit dtypes and falls back to the
+    python engine only when the file is malformed. Parsed samples are cached
+    on disk by content hash, so re-uploading the same export skips parsing.
+    Pass a dict as `parse_info` to get the engine, row count and seconds taken.
+    """
+    start = time.perf_counter()
+    if use_cache:
+        key = content_hash(file_path)
+        samples = load_samples(key)
+        if samples is not None:
+            record_parse_info(parse_info, 'cache', len(samples), start)
+            return samples
+
     try:
-        df = pd.read_csv(
+        dialect = sniff_csv_dialect(file_path)
+        _rewind(file_path)
+        try:
+            df, engine = _read_fast(file_path, dialect)
+        except (ValueError, pd.errors.ParserError):
+            _rewind(file_path)
+            df, engine = _read_python(file_path, dialect), 'python'
+    except Exception as e:
+        raise ValueError(f"Error reading CSV file: {e}") from e
+
+    samples = to_samples(df)
+    if use_cache:
+        store_samples(key, samples)
+    record_parse_info(parse_info, engine, len(samples), start)
+    return samples
+
+def iter_sample_chunks(file_path, chunksize=CHUNK_ROWS):
+    """
+    Streams a workout CSV as samples DataFrames of at most `chunksize` rows.
+    Bad lines are skipped and unparseable numbers become NaN, so a malformed
+    row never aborts a stream that is already being aggregated.
+    """
+    try:
+        dialect = sniff_csv_dialect(file_path)
+        _rewind(file_path)
+        reader = pd.read_csv(
             file_path,
-            delimiter=';',
-            decimal=',',
-            engine='python',
-            on_bad_lines='skip'
+            delimiter=dialect['delimiter'],
+            decimal=dialect['decimal'],
+            dtype=object,
+            engine='c',
+            on_bad_lines='skip',
+            chunksize=chunksize,
         )
     except Exception as e:
-        raise ValueError(f"Error reading CSV file: {e}")
+        raise ValueError(f"Error reading CSV file: {e}") from e
 
-    # Clean column names
-    df.columns = [col.strip().lower() for col in df.columns]
+    numeric_columns = [col for col, dtype in _column_dtypes(dialect['columns']).items() if dtype != object]
+    with reader:
+        for chunk in reader:
+            for col in numeric_columns:
+                if col in chunk.columns:
+                    values = chunk[col]
+                    if dialect['decimal'] == ',':
+                        values = values.str.replace(',', '.', regex=False)
+                    chunk[col] = pd.to_numeric(values, errors='coerce')
+            yield to_samples(chunk)
+
+def samples_to_records(samples):
+    """
+    Converts a samples DataFrame into the list of per-point dicts returned by parse_csv_file.
+    """
+    records = samples.astype(object)
+    keyword_fields = list(KEYWORD_FIELDS)
+    records[keyword_fields] = records[keyword_fields].where(records[keyword_fields].notna(), None)
+    return records.to_dict('records')
 
-    # Clean and convert columns with European decimal format
-    for col in ['latitude', 'longitude', 'elevation', 'distance']:
-        if col in df.columns:
-            df[col] = df[col].astype(str).str.replace(',', '.', regex=False)
-            df[col] = pd.to_numeric(df[col], errors='coerce')
-
-    data = []
-    for _, row in df.iterrows():
-        point_data = {
-            'timestamp': row.get('timestamp'),
-            'date': row.get('date'),
-            'iso8601': row.get('iso8601'),
-            'heart_rate': find_column_value(row, ['hr', 'heart_rate']),
-            'power': find_column_value(row, ['power']),
-            'cadence': find_column_value(row, ['cadence']),
-            'latitude': row.get('latitude'),
-            'longitude': row.get('longitude'),
-            'elevation': find_column_value(row, ['elevation']),
-            'distance': find_column_value(row, ['distance']),
-            'lap': find_column_value(row, ['lap']),
-            'since_start': find_column_value(row, ['since_start']),
-        }
-        data.append(point_data)
-
-    return data
\ No newline at end of file
+def parse_csv_file(file_path, use_cache=True):
+    return samples_to_records(read_samples(file_path, use_cache))
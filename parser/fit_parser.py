@@ -0,0 +1,161 @@
+import struct
+import pandas as pd
+from parser.csv_parser import SAMPLE_COLUMNS, CHUNK_ROWS, conform_samples
+
+FIT_EPOCH = 631065600  # 1989-12-31T00:00:00Z in Unix seconds
+SEMICIRCLES_TO_DEGREES = 180 / 2 ** 31
+
+RECORD_MESSAGE = 20
+LAP_MESSAGE = 19
+TIMESTAMP_FIELD = 253
+
+# Record message fields: number -> (sample column, scale, offset)
+RECORD_FIELDS = {
+    0: ('latitude', SEMICIRCLES_TO_DEGREES, 0),
+    1: ('longitude', SEMICIRCLES_TO_DEGREES, 0),
+    2: ('elevation', 1 / 5, -500),
+    3: ('heart_rate', 1, 0),
+    4: ('cadence', 1, 0),
+    5: ('distance', 1 / 100, 0),
+    7: ('power', 1, 0),
+    78: ('elevation', 1 / 5, -500),  # enhanced_altitude, preferred when present
+}
+
+# FIT base type (low 5 bits) -> struct code and the "invalid" marker value
+BASE_TYPES = {
+    0: ('B', 0xFF), 1: ('b', 0x7F), 2: ('B', 0xFF), 3: ('h', 0x7FFF), 4: ('H', 0xFFFF),
+    5: ('i', 0x7FFFFFFF), 6: ('I', 0xFFFFFFFF), 10: ('B', 0), 11: ('H', 0), 12: ('I', 0),
+    13: ('B', 0xFF),
+}
+
+
+def _definition(body, developer):
+    """
+    Compiles a definition message into (global message number, Struct, decoded field numbers, invalid values).
+    Only scalar fields this reader uses are unpacked; everything else is skipped as padding.
+    """
+    endian = '>' if body[1] == 1 else '<'
+    global_number = struct.unpack(endian + 'H', body[2:4])[0]
+    wanted = set(RECORD_FIELDS) | {TIMESTAMP_FIELD} if global_number == RECORD_MESSAGE else {TIMESTAMP_FIELD}
+    fmt, numbers, invalid = endian, [], []
+    for i in range(body[4]):
+        number, size, base_type = body[5 + 3 * i:8 + 3 * i]
+        code, marker = BASE_TYPES.get(base_type & 0x1F, (None, None))
+        if number in wanted and code is not None and struct.calcsize(code) == size:
+            fmt += code
+            numbers.append(number)
+            invalid.append(marker)
+        else:
+            fmt += f'{size}x'
+    for size in developer:
+        fmt += f'{size}x'
+    return global_number, struct.Struct(fmt), numbers, invalid
+
+def _read(f, size):
+    data = f.read(size)
+    if len(data) != size:
+        raise ValueError("Error reading FIT file: unexpected end of file")
+    return data
+
+def _to_frame(rows, first_timestamp):
+    samples = pd.DataFrame(rows, columns=['timestamp', 'lap', 'latitude', 'longitude', 'elevation',
+                                          'heart_rate', 'cadence', 'distance', 'power'])
+    times = pd.to_datetime(samples['timestamp'], unit='s')
+    samples['date'] = times.dt.strftime('%Y-%m-%d %H:%M:%S')
+    samples['iso8601'] = times.dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    if first_timestamp is not None:
+        samples['since_start'] = samples['timestamp'] - first_timestamp
+    return conform_samples(samples)
+
+def iter_fit_chunks(file_path, chunksize=CHUNK_ROWS):
+    """
+    Streams the record messages of a FIT file as samples DataFrames of at most `chunksize` rows.
+    Messages are decoded one at a time from the open file with precompiled structs, so
+    memory does not grow with the size of the file. Each lap message closes a lap.
+    """
+    if hasattr(file_path, 'seek'):
+        file_path.seek(0)
+        f, close = file_path, False
+    else:
+        f, close = open(file_path, 'rb'), True
+    try:
+        header_size = _read(f, 1)[0]
+        header = _read(f, header_size - 1)
+        if header[7:11] != b'.FIT':
+            raise ValueError("Error reading FIT file: not a FIT file")
+        data_size = struct.unpack('<I', header[3:7])[0]
+
+        definitions = {}
+        rows = []
+        lap = 1
+        last_timestamp = first_timestamp = None
+        position = 0
+        while position < data_size:
+            record_header = _read(f, 1)[0]
+            position += 1
+            offset = None
+            if record_header & 0x80:  # Compressed timestamp header, always a data message
+                local = (record_header >> 5) & 0x03
+                offset = record_header & 0x1F
+            elif record_header & 0x40:  # Definition message
+                local = record_header & 0x0F
+                body = _read(f, 5)
+                body += _read(f, 3 * body[4])
+                position += len(body)
+                developer = []
+                if record_header & 0x20:
+                    count = _read(f, 1)[0]
+                    developer = [size for _, size, _ in struct.iter_unpack('BBB', _read(f, 3 * count))]
+                    position += 1 + 3 * count
+                definitions[local] = _definition(body, developer)
+                continue
+            else:
+                local = record_header & 0x0F
+
+            if local not in definitions:
+                raise ValueError("Error reading FIT file: data message without a definition")
+            global_number, layout, numbers, invalid = definitions[local]
+            values = layout.unpack(_read(f, layout.size))
+            position += layout.size
+
+            fields = {number: value for number, value, marker in zip(numbers, values, invalid) if value != marker}
+            if TIMESTAMP_FIELD in fields:
+                last_timestamp = fields[TIMESTAMP_FIELD] + FIT_EPOCH
+            elif offset is not None and last_timestamp is not None:
+                # Only the low 5 bits are sent; roll over when they wrap
+                timestamp = (last_timestamp & ~0x1F) + offset
+                if offset < (last_timestamp & 0x1F):
+                    timestamp += 0x20
+                last_timestamp = timestamp
+
+            if global_number == LAP_MESSAGE:
+                lap += 1
+            elif global_number == RECORD_MESSAGE:
+                if first_timestamp is None:
+                    first_timestamp = last_timestamp
+                row = {'timestamp': last_timestamp, 'lap': lap}
+                for number, value in fields.items():
+                    if number in RECORD_FIELDS and (number != 2 or 78 not in fields):
+                        column, scale, shift = RECORD_FIELDS[number]
+                        row[column] = value * scale + shift
+                rows.append(row)
+                if len(rows) >= chunksize:
+                    yield _to_frame(rows, first_timestamp)
+                    rows = []
+
+        if rows:
+            yield _to_frame(rows, first_timestamp)
+    except struct.error as e:
+        raise ValueError(f"Error reading FIT file: {e}")
+    finally:
+        if close:
+            f.close()
+
+def read_fit_samples(file_path):
+    """
+    Reads a FIT file into the same samples DataFrame that read_samples returns for CSV exports.
+    """
+    chunks = list(iter_fit_chunks(file_path))
+    if not chunks:
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
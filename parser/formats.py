@@ -0,0 +1,109 @@
+import os
+import time
+import pandas as pd
+from parser.csv_parser import read_samples, iter_sample_chunks, record_parse_info, CHUNK_ROWS
+from parser.gpx_parser import read_gpx_samples, iter_gpx_chunks
+from parser.fit_parser import read_fit_samples, iter_fit_chunks
+from parser.sample_cache import content_hash, load_samples, store_samples
+
+# Supported workout file extensions, in the order the uploader lists them
+WORKOUT_EXTENSIONS = ['csv', 'gpx', 'fit']
+
+READERS = {
+    'gpx': read_gpx_samples,
+    'fit': read_fit_samples,
+}
+
+CHUNK_READERS = {
+    'csv': iter_sample_chunks,
+    'gpx': iter_gpx_chunks,
+    'fit': iter_fit_chunks,
+}
+
+# Samples read to find the date a workout started
+START_DATE_ROWS = 100
+
+# Engine names reported for streamed reads
+CHUNK_ENGINES = {
+    'csv': 'c (chunked)',
+    'gpx': 'gpx (chunked)',
+    'fit': 'fit (chunked)',
+}
+
+
+def _head(file_path, size=512):
+    if hasattr(file_path, 'read'):
+        position = file_path.tell()
+        file_path.seek(0)
+        head = file_path.read(size)
+        file_path.seek(position)
+    else:
+        with open(file_path, 'rb') as f:
+            head = f.read(size)
+    return head if isinstance(head, bytes) else head.encode('utf-8')
+
+def detect_format(file_path):
+    """
+    Returns 'csv', 'gpx' or 'fit' for a path or upload, from its extension or, failing that, its first bytes.
+    """
+    name = str(getattr(file_path, 'name', file_path))
+    extension = os.path.splitext(name)[1].lower().lstrip('.')
+    if extension in WORKOUT_EXTENSIONS:
+        return extension
+    head = _head(file_path)
+    if head[8:12] == b'.FIT':
+        return 'fit'
+    if b'<gpx' in head:
+        return 'gpx'
+    return 'csv'
+
+def read_workout_samples(file_path, use_cache=True, parse_info=None):
+    """
+    Reads a CSV, GPX or FIT workout into the canonical samples DataFrame, picking the
+    reader from the file. Parsed samples are cached by content hash for every format.
+    Pass a dict as `parse_info` to get the engine, row count and seconds taken.
+    """
+    file_format = detect_format(file_path)
+    if file_format == 'csv':
+        return read_samples(file_path, use_cache, parse_info)
+
+    start = time.perf_counter()
+    key = content_hash(file_path) if use_cache else None
+    samples = load_samples(key) if use_cache else None
+    engine = 'cache'
+    if samples is None:
+        samples = READERS[file_format](file_path)
+        engine = file_format
+        if len(samples) == 0:
+            raise ValueError(f"No track points found in {file_format.upper()} file")
+        if use_cache:
+            store_samples(key, samples)
+    record_parse_info(parse_info, engine, len(samples), start)
+    return samples
+
+def iter_workout_chunks(file_path, chunksize=CHUNK_ROWS, parse_info=None):
+    """
+    Streams a CSV, GPX or FIT workout as samples DataFrames of at most `chunksize` rows.
+    Once the stream is exhausted, `parse_info` (if given) holds the engine, row count and seconds taken.
+    """
+    file_format = detect_format(file_path)
+    start = time.perf_counter()
+    rows = 0
+    for chunk in CHUNK_READERS[file_format](file_path, chunksize):
+        rows += len(chunk)
+        yield chunk
+    record_parse_info(parse_info, CHUNK_ENGINES[file_format], rows, start)
+
+def samples_start_date(samples):
+    """
+    Returns the date ('YYYY-MM-DD') of the first timestamped sample, or None.
+    """
+    dates = pd.to_datetime(samples['date'], errors='coerce').dropna()
+    return dates.iloc[0].strftime('%Y-%m-%d') if not dates.empty else None
+
+def workout_start_date(file_path):
+    """
+    Returns the date a CSV, GPX or FIT workout started, reading only its first samples.
+    """
+    chunk = next(iter_workout_chunks(file_path, START_DATE_ROWS), None)
+    return samples_start_date(chunk) if chunk is not None else None
@@ -0,0 +1,103 @@
+import xml.etree.ElementTree as ET
+from functools import lru_cache
+import pandas as pd
+from parser.csv_parser import SAMPLE_COLUMNS, CHUNK_ROWS, conform_samples
+
+# Track point child elements (any namespace) and the sample column they fill
+GPX_FIELDS = {
+    'ele': 'elevation',
+    'hr': 'heart_rate',
+    'heartrate': 'heart_rate',
+    'cad': 'cadence',
+    'cadence': 'cadence',
+    'power': 'power',
+    'watts': 'power',
+    'distance': 'distance',
+}
+
+
+@lru_cache(maxsize=None)  # A file only uses a handful of distinct tags
+def _local_name(tag):
+    # '{http://www.topografix.com/GPX/1/1}trkpt' -> 'trkpt'
+    return tag.rsplit('}', 1)[-1].lower()
+
+def _float(text):
+    try:
+        return float(text)
+    except (TypeError, ValueError):
+        return None
+
+def _to_frame(points, first_time):
+    samples = pd.DataFrame(points, columns=['time', 'latitude', 'longitude', 'lap', *set(GPX_FIELDS.values())])
+    # Times are parsed once per chunk, in UTC, rather than once per point
+    times = pd.to_datetime(samples.pop('time'), utc=True, format='ISO8601', errors='coerce').dt.tz_localize(None)
+    samples['date'] = times.dt.strftime('%Y-%m-%d %H:%M:%S')
+    samples['iso8601'] = times.dt.strftime('%Y-%m-%dT%H:%M:%SZ')
+    samples['timestamp'] = (times - pd.Timestamp(0)).dt.total_seconds()
+    if first_time is not None:
+        first = pd.to_datetime(first_time, utc=True, format='ISO8601').tz_localize(None)
+        samples['since_start'] = (times - first).dt.total_seconds()
+    return conform_samples(samples)
+
+def iter_gpx_chunks(file_path, chunksize=CHUNK_ROWS):
+    """
+    Streams the track points of a GPX file as samples DataFrames of at most `chunksize` rows.
+    The XML is read incrementally and every point is discarded once converted, so
+    memory does not grow with the size of the file. Each track segment is a lap.
+    """
+    if hasattr(file_path, 'seek'):
+        file_path.seek(0)
+    points = []
+    first_time = None
+    lap = 0
+    segment = None
+    try:
+        for event, elem in ET.iterparse(file_path, events=('start', 'end')):
+            name = _local_name(elem.tag)
+            if event == 'start':
+                if name == 'trkseg':
+                    segment = elem
+                    lap += 1
+                continue
+            if name != 'trkpt':
+                if name == 'trk':
+                    elem.clear()
+                continue
+
+            point = {
+                'time': None,
+                'latitude': _float(elem.get('lat')),
+                'longitude': _float(elem.get('lon')),
+                'lap': lap or None,
+            }
+            for child in elem.iter():
+                child_name = _local_name(child.tag)
+                if child_name == 'time' and child.text:
+                    point['time'] = child.text.strip()
+                elif child_name in GPX_FIELDS:
+                    point[GPX_FIELDS[child_name]] = _float(child.text)
+            if first_time is None and point['time'] is not None:
+                first_time = point['time']
+            points.append(point)
+
+            # Drop the converted point from the tree so it can be garbage collected
+            elem.clear()
+            if segment is not None:
+                segment.clear()
+            if len(points) >= chunksize:
+                yield _to_frame(points, first_time)
+                points = []
+    except ET.ParseError as e:
+        raise ValueError(f"Error reading GPX file: {e}")
+
+    if points:
+        yield _to_frame(points, first_time)
+
+def read_gpx_samples(file_path):
+    """
+    Reads a GPX file into the same samples DataFrame that read_samples returns for CSV exports.
+    """
+    chunks = list(iter_gpx_chunks(file_path))
+    if not chunks:
+        return pd.DataFrame(columns=SAMPLE_COLUMNS)
+    return pd.concat(chunks, ignore_index=True)
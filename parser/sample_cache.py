@@ -0,0 +1,107 @@
+import numpy as np
+import pandas as pd
+import hashlib
+import json
+import os
+import shutil
+
+CACHE_DIR = os.path.join('data', 'sample_cache')
+MAX_CACHE_BYTES = 256 * 1024 * 1024  # Oldest entries are evicted above this size
+
+def content_hash(file):
+    """
+    Returns the SHA-256 hex digest of an upload, a file-like object or a file path.
+    """
+    digest = hashlib.sha256()
+    if hasattr(file, 'getbuffer'):
+        digest.update(file.getbuffer())
+    elif hasattr(file, 'read'):
+        position = file.tell()
+        while True:
+            block = file.read(1024 * 1024)
+            if not block:
+                break
+            digest.update(block if isinstance(block, bytes) else block.encode('utf-8'))
+        file.seek(position)
+    else:
+        with open(file, 'rb') as f:
+            for block in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(block)
+    return digest.hexdigest()
+
+def _entry_size(path):
+    return sum(entry.stat().st_size for entry in os.scandir(path) if entry.is_file())
+
+def load_samples(key, cache_dir=CACHE_DIR):
+    """
+    Loads cached samples for `key`, memory-mapping the numeric columns.
+    Returns None on a cache miss.
+    """
+    path = os.path.join(cache_dir, key)
+    try:
+        with open(os.path.join(path, 'manifest.json')) as f:
+            manifest = json.load(f)
+        columns = {}
+        for col, kind in manifest['columns']:
+            if kind == 'none':
+                columns[col] = np.full(manifest['rows'], None, dtype=object)
+            elif kind == 'text':
+                values = np.load(os.path.join(path, f'{col}.npy')).astype(object)
+                values[values == ''] = None
+                columns[col] = values
+            else:
+                columns[col] = np.load(os.path.join(path, f'{col}.npy'), mmap_mode='r')
+    except (OSError, ValueError):
+        return None
+
+    os.utime(path)  # Mark as recently used for LRU eviction
+    return pd.DataFrame(columns, copy=False)
+
+def store_samples(key, samples, cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Writes samples to the cache as one .npy file per column, then evicts
+    least recently used entries until the cache fits in `max_bytes`.
+    """
+    path = os.path.join(cache_dir, key)
+    tmp_path = f'{path}.tmp{os.getpid()}'
+    os.makedirs(tmp_path, exist_ok=True)
+
+    manifest = {'rows': len(samples), 'columns': []}
+    for col in samples.columns:
+        values = samples[col]
+        if values.isna().all() and not pd.api.types.is_numeric_dtype(values):
+            kind = 'none'
+        elif pd.api.types.is_numeric_dtype(values):
+            kind = 'numeric'
+            np.save(os.path.join(tmp_path, f'{col}.npy'), values.to_numpy())
+        else:
+            kind = 'text'
+            np.save(os.path.join(tmp_path, f'{col}.npy'), values.fillna('').astype(str).to_numpy(dtype=str))
+        manifest['columns'].append([col, kind])
+
+    with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+        json.dump(manifest, f)
+
+    try:
+        os.replace(tmp_path, path)
+    except OSError:
+        # Another session cached the same upload first
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+    evict(cache_dir, max_bytes)
+
+def evict(cache_dir=CACHE_DIR, max_bytes=MAX_CACHE_BYTES):
+    """
+    Removes least recently used cache entries until the total size is under `max_bytes`.
+    """
+    entries = []
+    for entry in os.scandir(cache_dir):
+        if entry.is_dir() and '.tmp' not in entry.name:
+            entries.append((entry.stat().st_mtime, _entry_size(entry.path), entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
@@ -0,0 +1,85 @@
+import os
+import tempfile
+import unittest
+import numpy as np
+from parser.csv_parser import read_samples, iter_sample_chunks
+from parser.formats import iter_workout_chunks
+from utils.stats_utils import analyze_workout_data, analyze_workout_stream
+
+HEALTHFIT_EXPORT = """timestamp;date;since_start;HR (count/min);Elapsed time;Distance (m);lap
+1714545000;2024-05-01 06:30:00;0;120;00:00:00;0,0;1
+1714545001;2024-05-01 06:30:01;1;122;00:00:01;3,1;1
+1714545002;2024-05-01 06:30:02;2;125;00:00:02;6,3;1
+"""
+
+# One garbled heart rate and one empty power cell: the fast engine gives up on this file
+GARBLED_EXPORT = """timestamp;date;since_start;HR (count/min);Power (W);Distance (m);latitude;longitude
+1714545000;2024-05-01 06:30:00;0;120;200;0,0;45,46;9,19
+1714545001;2024-05-01 06:30:01;1;--;210;3,1;45,4601;9,1901
+1714545002;2024-05-01 06:30:02;2;130;;6,3;45,4602;9,1902
+"""
+PROFILE = ('male', 70.0, 175.0, 30)
+
+GPX_EXPORT = """<?xml version="1.0"?>
+<gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1"><trk><trkseg>
+<trkpt lat="45.46" lon="9.19"><time>2024-05-01T06:30:00Z</time></trkpt>
+<trkpt lat="45.4601" lon="9.1901"><time>2024-05-01T06:30:01Z</time></trkpt>
+<trkpt lat="45.4602" lon="9.1902"><time>2024-05-01T06:30:02Z</time></trkpt>
+</trkseg></trk></gpx>
+"""
+
+
+class CsvParserTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def write(self, text, name='2024-05-01-run.csv'):
+        path = os.path.join(self.dir.name, name)
+        with open(path, 'w') as f:
+            f.write(text)
+        return path
+
+    def test_text_column_named_like_a_keyword_keeps_fast_engine(self):
+        # "Elapsed time" contains 'lap' but holds text, so it must not be read as float
+        parse_info = {}
+        samples = read_samples(self.write(HEALTHFIT_EXPORT), use_cache=False, parse_info=parse_info)
+        self.assertNotEqual(parse_info['engine'], 'python')
+        self.assertEqual(samples['heart_rate'].tolist(), [120, 122, 125])
+        self.assertEqual(samples['distance'].tolist(), [0.0, 3.1, 6.3])
+        self.assertEqual(samples['lap'].tolist(), [1, 1, 1])
+
+    def test_chunks_match_whole_file(self):
+        path = self.write(HEALTHFIT_EXPORT)
+        chunks = list(iter_sample_chunks(path, chunksize=2))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual(sum(chunk['distance'].sum() for chunk in chunks), 9.4)
+
+    def test_garbled_numeric_cell_gives_same_stats_on_both_paths(self):
+        path = self.write(GARBLED_EXPORT)
+        parse_info = {}
+        samples = read_samples(path, use_cache=False, parse_info=parse_info)
+        self.assertEqual(parse_info['engine'], 'python')
+        self.assertEqual(samples['heart_rate'].dtype, 'float64')
+        stats = analyze_workout_data(samples, *PROFILE)
+        self.assertEqual(stats['avg_heart_rate'], 125.0)
+        np.testing.assert_equal(stats, analyze_workout_stream(path, *PROFILE))
+
+    def test_streamed_gpx_reports_its_own_parse_info(self):
+        parse_info = {}
+        chunks = list(iter_workout_chunks(self.write(GPX_EXPORT, '2024-05-01-run.gpx'), 2, parse_info))
+        self.assertEqual([len(chunk) for chunk in chunks], [2, 1])
+        self.assertEqual((parse_info['engine'], parse_info['rows']), ('gpx (chunked)', 3))
+
+    def test_empty_file_error_is_not_prefixed_twice(self):
+        with self.assertRaises(ValueError) as raised:
+            read_samples(self.write(''), use_cache=False)
+        self.assertEqual(str(raised.exception), "Error reading CSV file: file is empty")
+        self.assertIsInstance(raised.exception.__cause__, ValueError)
+
+
+if __name__ == '__main__':
+    unittest.main()
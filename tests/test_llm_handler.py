@@ -0,0 +1,194 @@
+import json
+import socket
+import threading
+import time
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import requests
+from model.llm_handler import LLMClient, hide_reasoning, MAX_CONCURRENCY
+from utils.timing import set_metrics_path
+
+
+def setUpModule():
+    # Keep timing spans out of data/metrics.jsonl (stream producers may outlive a test)
+    set_metrics_path(None)
+
+
+class StubServer:
+    """
+    Local stand-in for the LM Studio chat completions endpoint. `reply(handler, n)`
+    answers the n-th request (starting at 1); the server records the request count and
+    the peak number of requests in flight.
+    """
+
+    def __init__(self, reply):
+        self.reply = reply
+        self.requests = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.lock = threading.Lock()
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'  # Chunked streams, like LM Studio
+
+            def do_POST(self):
+                self.rfile.read(int(self.headers['Content-Length']))
+                with stub.lock:
+                    stub.requests += 1
+                    stub.in_flight += 1
+                    stub.peak = max(stub.peak, stub.in_flight)
+                    n = stub.requests
+                try:
+                    stub.reply(self, n)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+                finally:
+                    with stub.lock:
+                        stub.in_flight -= 1
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        self.server.daemon_threads = True
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}/v1/chat/completions"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+def send_json(handler, body, status=200):
+    data = json.dumps(body).encode()
+    handler.send_response(status)
+    handler.send_header('Content-Type', 'application/json')
+    handler.send_header('Content-Length', str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+def completion(text):
+    return {'choices': [{'message': {'content': text}}], 'usage': {'completion_tokens': 1, 'prompt_tokens': 1}}
+
+def send_stream(handler, deltas, pause=0.0):
+    # Server-sent events, one HTTP chunk per event
+    def send_chunk(data):
+        handler.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+        handler.wfile.flush()
+
+    handler.send_response(200)
+    handler.send_header('Content-Type', 'text/event-stream')
+    handler.send_header('Transfer-Encoding', 'chunked')
+    handler.end_headers()
+    for delta in deltas:
+        chunk = {'choices': [{'delta': {'content': delta}}]}
+        send_chunk(f"data: {json.dumps(chunk)}\n\n".encode())
+        time.sleep(pause)
+    send_chunk(b"data: [DONE]\n\n")
+    send_chunk(b"")
+
+
+class LLMClientTest(unittest.TestCase):
+
+    def setUp(self):
+        self.servers = []
+        self.clients = []
+
+    def tearDown(self):
+        for client in self.clients:
+            client.close()
+        for server in self.servers:
+            server.close()
+
+    def stub(self, reply):
+        server = StubServer(reply)
+        self.servers.append(server)
+        return server
+
+    def client(self, url, **kwargs):
+        client = LLMClient(url, backoff=0.01, **kwargs)
+        self.clients.append(client)
+        return client
+
+    def test_retries_after_503(self):
+        def reply(handler, n):
+            if n == 1:
+                send_json(handler, {'error': 'model loading'}, status=503)
+            else:
+                send_json(handler, completion("Easy run"))
+
+        server = self.stub(reply)
+        self.assertEqual(self.client(server.url).complete({}), "Easy run")
+        self.assertEqual(server.requests, 2)
+
+    def test_read_timeout(self):
+        server = self.stub(lambda handler, n: time.sleep(1))
+        client = self.client(server.url, read_timeout=0.2, max_retries=1)
+        with self.assertRaises(requests.exceptions.Timeout):
+            client.complete({})
+        self.assertEqual(server.requests, 2)
+
+    def test_refused_connection(self):
+        with socket.socket() as sock:
+            sock.bind(('127.0.0.1', 0))
+            port = sock.getsockname()[1]  # Nothing listens here once the socket is closed
+        client = self.client(f"http://127.0.0.1:{port}/v1/chat/completions", connect_timeout=0.5)
+        with self.assertRaises(requests.exceptions.ConnectionError):
+            client.complete({})
+
+    def test_concurrency_peak_stays_at_limit(self):
+        def reply(handler, n):
+            time.sleep(0.2)
+            send_json(handler, completion(f"answer {n}"))
+
+        server = self.stub(reply)
+        client = self.client(server.url)
+        futures = [client.submit(f"prompt {i}", use_cache=False, raise_errors=True) for i in range(3 * MAX_CONCURRENCY)]
+        self.assertEqual(len({future.result(timeout=10) for future in futures}), 3 * MAX_CONCURRENCY)
+        self.assertEqual(server.peak, MAX_CONCURRENCY)
+
+    def test_stream_deltas_arrive_in_order(self):
+        deltas = ["<think>", "plan", "</think>", "Easy", " run", " for", " 40", " min"]
+        server = self.stub(lambda handler, n: send_stream(handler, deltas))
+        stream = self.client(server.url).start_stream("prompt", use_cache=False)
+        self.assertEqual(list(stream), ["Easy", " run", " for", " 40", " min"])
+
+    def test_closed_stream_frees_its_slot(self):
+        server = self.stub(lambda handler, n: send_stream(handler, ["token"] * 200, pause=0.02))
+        client = self.client(server.url, max_concurrency=1)
+        stream = client.start_stream("prompt", use_cache=False)
+        self.assertEqual(next(stream), "token")
+        stream.close()
+        # The producer hangs up at the next chunk, long before the server would finish
+        self.assertTrue(client.slot().acquire(timeout=1))
+        client.slot().release()
+        second = client.start_stream("other prompt", use_cache=False)
+        self.assertEqual(next(second), "token")
+        second.close()
+
+
+class HideReasoningTest(unittest.TestCase):
+
+    def test_reasoning_block_is_hidden(self):
+        deltas = ["<th", "ink>plan the reply", "</th", "ink>\n\n", "Easy", " run"]
+        self.assertEqual(list(hide_reasoning(deltas)), ["Easy", " run"])
+
+    def test_reply_without_reasoning_streams_immediately(self):
+        def deltas():
+            yield "  Easy"
+            # The first delta must already have been emitted
+            self.assertEqual(seen, ["Easy"])
+            yield " run"
+
+        seen = []
+        for delta in hide_reasoning(deltas()):
+            seen.append(delta)
+        self.assertEqual(seen, ["Easy", " run"])
+
+    def test_unterminated_reasoning_is_emitted_at_the_end(self):
+        self.assertEqual(list(hide_reasoning(["<think>", "still thinking"])), ["<think>still thinking"])
+
+
+if __name__ == '__main__':
+    unittest.main()
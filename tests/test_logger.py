@@ -0,0 +1,37 @@
+import io
+import os
+import tempfile
+import unittest
+from model.logger import log_workout, fetch_workout_log
+from utils.timing import set_metrics_path
+
+
+def setUpModule():
+    set_metrics_path(None)
+
+
+class Upload(io.BytesIO):
+    name = 'Morning Run.csv'
+
+
+STATS = {'total_distance': 5000.0, 'workout_duration': 30.0, 'avg_heart_rate': 140.0}
+
+
+class LogWorkoutTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.dir.name, 'workout_log.db')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_undated_file_is_upserted_on_the_given_date(self):
+        for _ in range(2):
+            log_workout(Upload(b"run"), STATS, 'Outdoor Run', db_path=self.db_path, workout_date='2024-05-01')
+        log = fetch_workout_log(self.db_path)
+        self.assertEqual(log['date'].tolist(), ['2024-05-01'])
+
+
+if __name__ == '__main__':
+    unittest.main()
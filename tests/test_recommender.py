@@ -0,0 +1,66 @@
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import Future
+from unittest import mock
+from model import recommender
+from model.storage import transaction
+from utils.timing import set_metrics_path
+
+
+def setUpModule():
+    set_metrics_path(None)
+
+
+class RecommenderQueueTest(unittest.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.db_path = os.path.join(self.dir.name, 'recommendations.db')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def run_claimed(self, worker, answer):
+        with mock.patch.object(recommender, 'ask_local_llm', side_effect=answer):
+            return [recommender.run_job(job, None, self.db_path)
+                    for job in recommender.claim_jobs(worker, 5, self.db_path)]
+
+    def test_failed_job_waits_before_retry(self):
+        job_id = recommender.enqueue("prompt", db_path=self.db_path)
+        with mock.patch.object(recommender, 'RETRY_DELAY_SECONDS', 0.2):
+            self.assertEqual(self.run_claimed('w1', RuntimeError("server down")), ['pending'])
+            self.assertEqual(recommender.claim_jobs('w1', 5, self.db_path), [])
+            time.sleep(0.25)
+            self.assertEqual(self.run_claimed('w1', ["Easy run"]), ['done'])
+        job = recommender.fetch_job(job_id, self.db_path)
+        self.assertEqual((job['status'], job['result'], job['attempts']), ('done', "Easy run", 2))
+
+    def test_running_job_of_live_worker_is_not_reclaimed(self):
+        recommender.enqueue("prompt", db_path=self.db_path)
+        self.assertEqual(len(recommender.claim_jobs('w1', 5, self.db_path)), 1)
+        recommender.claim_jobs('w1', 0, self.db_path)  # w1 keeps polling while the job runs
+        self.assertEqual(recommender.claim_jobs('w2', 5, self.db_path), [])
+
+    def test_job_of_silent_worker_is_requeued(self):
+        recommender.enqueue("prompt", db_path=self.db_path)
+        recommender.claim_jobs('w1', 5, self.db_path)
+        with transaction(self.db_path, recommender.RECOMMENDATION_MIGRATIONS) as conn:
+            conn.execute("UPDATE recommendation_workers SET last_seen = last_seen - ?",
+                         (3 * recommender.HEARTBEAT_SECONDS + 1,))
+        self.assertEqual([job[1] for job in recommender.claim_jobs('w2', 5, self.db_path)], ["prompt"])
+
+    def test_stale_threshold_covers_a_full_attempt(self):
+        self.assertGreater(recommender.STALE_JOB_SECONDS, recommender.MAX_ATTEMPT_SECONDS)
+
+    def test_report_does_not_raise_for_crashed_job(self):
+        future = Future()
+        future.set_exception(RuntimeError("boom"))
+        with mock.patch('builtins.print') as printed:
+            recommender._report(1, future)
+        self.assertIn("crashed", printed.call_args[0][0])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,220 @@
+import numpy as np
+import pandas as pd
+from utils.track import track_arrays, cumulative_distance, segment_distances, segment_speeds
+
+HR_ZONE_BOUNDS = [0.6, 0.7, 0.8, 0.9]  # Fractions of max HR separating zones 1..5
+MAX_GAP_SECONDS = 30           # Longer gaps between samples are pauses, not training time
+POWER_WINDOW_SECONDS = 30      # Rolling window for Normalized Power
+ELEVATION_WINDOW_SAMPLES = 60  # Block average that removes barometric/GPS jitter
+SPLIT_METERS = 1000
+MOVING_SPEED_MPS = 0.5         # Slower GPS segments are standing still, not moving
+THRESHOLD_HR_FRACTION = 0.88  # Lactate threshold HR as a fraction of max HR, for heart-rate TSS
+
+
+def _column(samples, name):
+    '''
+    Returns a sample column as a float array, or None if the export does not have it.
+    '''
+    if name not in samples or samples[name].isna().all():
+        return None
+    return pd.to_numeric(samples[name], errors='coerce').to_numpy(dtype=float)
+
+def elapsed_seconds(samples):
+    '''
+    Seconds since the first sample, from `since_start`, then `date`, then the sample index (1 Hz).
+    '''
+    since_start = _column(samples, 'since_start')
+    if since_start is not None and not np.isnan(since_start).any():
+        return since_start - since_start[0]
+    if 'date' in samples and samples['date'].notna().all():
+        dates = pd.to_datetime(samples['date'], errors='coerce')
+        if dates.notna().all():
+            ns = dates.to_numpy(dtype='datetime64[ns]').astype(np.int64)
+            return (ns - ns[0]) / 1e9
+    return np.arange(len(samples), dtype=float)
+
+def sample_weights(t):
+    '''
+    Seconds each sample represents (time until the next one), with pauses capped at MAX_GAP_SECONDS.
+    '''
+    dt = np.empty_like(t)
+    dt[:-1] = np.diff(t)
+    dt[-1] = 0.0
+    return np.clip(dt, 0.0, MAX_GAP_SECONDS)
+
+def hr_zone_seconds(heart_rate, dt, max_hr):
+    '''
+    Seconds spent in heart-rate zones 1..5 (below 60 % of max HR counts as zone 1).
+    '''
+    valid = ~np.isnan(heart_rate)
+    zones = np.searchsorted(np.asarray(HR_ZONE_BOUNDS) * max_hr, heart_rate[valid], side='right')
+    return np.bincount(zones, weights=dt[valid], minlength=len(HR_ZONE_BOUNDS) + 1)
+
+def power_metrics(power, t, ftp=None):
+    '''
+    Rolling 30 s power, Normalized Power and, when FTP is known, Intensity Factor and TSS.
+    Power is resampled onto a 1 s grid first, so NP does not depend on the recording interval.
+    '''
+    valid = ~np.isnan(power)
+    if valid.sum() < 2:
+        return None
+    t_valid, p_valid = t[valid], power[valid]
+    grid = np.arange(t_valid[0], t_valid[-1] + 1.0)
+    watts = np.interp(grid, t_valid, p_valid)
+    window = min(POWER_WINDOW_SECONDS, len(watts))
+    csum = np.concatenate(([0.0], np.cumsum(watts)))
+    rolling = (csum[window:] - csum[:-window]) / window
+
+    normalized_power = float(np.mean(rolling ** 4) ** 0.25)
+    metrics = {
+        'max_power_30s': float(rolling.max()),
+        'normalized_power': normalized_power,
+        'intensity_factor': None,
+        'tss': None,
+    }
+    if ftp:
+        intensity_factor = normalized_power / ftp
+        metrics['intensity_factor'] = intensity_factor
+        metrics['tss'] = len(grid) * normalized_power * intensity_factor / (ftp * 3600) * 100
+    return metrics
+
+def elevation_gain(elevation):
+    '''
+    Cumulative positive elevation gain after smoothing out sensor noise.
+    Samples are averaged in blocks of ELEVATION_WINDOW_SAMPLES (smaller for short
+    workouts) and only rises between consecutive blocks are summed, so jitter
+    around a flat profile does not add up to phantom climbing.
+    '''
+    valid = elevation[~np.isnan(elevation)]
+    if len(valid) < 2:
+        return None
+    window = max(1, min(ELEVATION_WINDOW_SAMPLES, len(valid) // 4))
+    starts = np.arange(0, len(valid), window)
+    blocks = np.add.reduceat(valid, starts) / np.diff(np.append(starts, len(valid)))
+    return float(np.clip(np.diff(blocks), 0.0, None).sum())
+
+def distance_splits(distance, t, split=SPLIT_METERS):
+    '''
+    Seconds per full kilometre (or `split` metres), interpolated at each split mark.
+    The final partial split is included with its own distance.
+    '''
+    valid = ~np.isnan(distance)
+    if valid.sum() < 2:
+        return []
+    t_valid = t[valid]
+    d_valid = np.maximum.accumulate(distance[valid])  # Cumulative distance never goes backwards
+    total = d_valid[-1]
+    marks = np.arange(split, total, split)
+    times = np.interp(marks, d_valid, t_valid)
+    bounds_d = np.concatenate(([d_valid[0]], marks, [total]))
+    bounds_t = np.concatenate(([t_valid[0]], times, [t_valid[-1]]))
+    seconds = np.diff(bounds_t)
+    meters = np.diff(bounds_d)
+    keep = meters > 0
+    return [
+        {'split': i + 1, 'meters': float(m), 'seconds': float(s),
+         'pace_s_per_km': float(s / m * 1000)}
+        for i, (m, s) in enumerate(zip(meters[keep], seconds[keep]))
+    ]
+
+def speed_metrics(lat, lon, t):
+    '''
+    Average moving speed and max speed in m/s from the GPS fixes. Speeds are measured
+    between consecutive fixes, so a dropout does not show up as one very fast segment;
+    pauses (slow or longer than MAX_GAP_SECONDS) are left out of the moving average.
+    '''
+    fixes = ~np.isnan(lat)
+    if fixes.sum() < 2:
+        return None
+    lat, lon, t = lat[fixes], lon[fixes], t[fixes]
+    speeds = segment_speeds(lat, lon, t)
+    moving = (speeds >= MOVING_SPEED_MPS) & (np.diff(t) <= MAX_GAP_SECONDS)
+    if not moving.any():
+        return None
+    return {
+        'moving_speed': float(segment_distances(lat, lon)[moving].sum() / np.diff(t)[moving].sum()),
+        'max_speed': float(speeds[moving].max()),
+    }
+
+def hr_energy_kcal(heart_rate, dt, user_gender, weight_kg, age):
+    '''
+    Energy expenditure from heart rate (Keytel et al. 2005), integrated sample by sample.
+    '''
+    if str(user_gender).lower() == 'male':
+        kj_per_min = -55.0969 + 0.6309 * heart_rate + 0.1988 * weight_kg + 0.2017 * age
+    else:
+        kj_per_min = -20.4022 + 0.4472 * heart_rate - 0.1263 * weight_kg + 0.074 * age
+    kcal_per_min = np.clip(np.nan_to_num(kj_per_min / 4.184), 0.0, None)
+    return float(np.sum(kcal_per_min * dt) / 60)
+
+def compute_metrics(samples, user_gender, weight_kg, age, ftp=None, max_hr=None):
+    '''
+    Per-sample training metrics for one workout, computed with array operations only.
+    Returns a dict with hr_zone_seconds, power metrics, elevation_gain, splits,
+    moving/max speed (m/s) and hr_calories; metrics whose columns are missing from
+    the export are None (or []).
+    '''
+    if len(samples) == 0:
+        raise ValueError("No workout data available")
+    t = elapsed_seconds(samples)
+    dt = sample_weights(t)
+    max_hr = max_hr or 220 - age
+
+    heart_rate = _column(samples, 'heart_rate')
+    power = _column(samples, 'power')
+    elevation = _column(samples, 'elevation')
+    distance = _column(samples, 'distance')
+    track = track_arrays(samples)
+    if distance is None and track is not None:
+        distance = cumulative_distance(*track)  # No device distance: measure the GPS track
+
+    metrics = {
+        'hr_zone_seconds': None,
+        'hr_calories': None,
+        'max_power_30s': None,
+        'normalized_power': None,
+        'intensity_factor': None,
+        'tss': None,
+        'elevation_gain': elevation_gain(elevation) if elevation is not None else None,
+        'splits': distance_splits(distance, t) if distance is not None else [],
+        'moving_speed': None,
+        'max_speed': None,
+    }
+    if track is not None:
+        metrics.update(speed_metrics(*track, t) or {})
+    if heart_rate is not None:
+        metrics['hr_zone_seconds'] = hr_zone_seconds(heart_rate, dt, max_hr).tolist()
+        if weight_kg is not None:
+            metrics['hr_calories'] = hr_energy_kcal(heart_rate, dt, user_gender, weight_kg, age)
+    if power is not None:
+        metrics.update(power_metrics(power, t, ftp) or {})
+    return metrics
+
+def with_sample_metrics(stats, metrics):
+    '''
+    Returns a copy of `stats` with the estimates that need every sample taken from
+    compute_metrics: the noise-filtered elevation gain and, when heart rate was
+    recorded, the heart-rate calories. Streamed stats keep their own estimates.
+    '''
+    stats = dict(stats)
+    if metrics['elevation_gain'] is not None:
+        stats['elevation_gain'] = metrics['elevation_gain']
+    if metrics['hr_calories'] is not None:
+        stats['total_calories'] = metrics['hr_calories']
+    return stats
+
+def training_load(stats, metrics=None, age=None, max_hr=None):
+    '''
+    TSS-like load of one workout: power TSS when available, otherwise heart-rate TSS
+    (hours x (avg HR / threshold HR)^2 x 100, threshold at 88 % of max HR).
+    Returns None when neither is known, leaving the duration-based estimate to the log.
+    '''
+    if metrics is not None and metrics.get('tss') is not None:
+        return float(metrics['tss'])
+    avg_heart_rate = stats.get('avg_heart_rate')
+    duration = stats.get('workout_duration')
+    max_hr = max_hr or (220 - age if age else None)
+    if not max_hr or avg_heart_rate is None or duration is None or np.isnan(avg_heart_rate) or np.isnan(duration):
+        return None
+    threshold_hr = THRESHOLD_HR_FRACTION * max_hr
+    return float(duration / 60 * (avg_heart_rate / threshold_hr) ** 2 * 100)
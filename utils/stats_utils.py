@@ -1,13 +1,8 @@
 import pandas as pd
-import streamlit as st
 import numpy as np
-import os
 import re
-import datetime as dt
-from model.llm_handler import ask_local_llm
-from model.logger import log_workout  # Updated import
-from parser.csv_parser import parse_csv_file  # Import the CSV parser
-import sqlite3
+from parser.formats import iter_workout_chunks  # CSV, GPX or FIT, picked from the file
+from utils.track import track_arrays, cumulative_distance, segment_distances, bounding_box
 
 def calculate_bmr(user_gender, weight_kg, height_cm, age):
     '''
@@ -56,31 +51,65 @@ def estimate_total_calories_burned(user_gender, weight, height_cm, age, activity
 
     return total_calories
 
+def heart_rate_intensity(age, avg_heart_rate):
+    '''
+    'low', 'moderate' or 'high' activity intensity from the average heart rate
+    (same thresholds as calculate_act_int_factor); 'moderate' without heart rate or age.
+    '''
+    if avg_heart_rate is None or pd.isna(avg_heart_rate) or not age:
+        return 'moderate'
+    return {0.6: 'low', 1.0: 'moderate'}.get(calculate_act_int_factor(age, avg_heart_rate), 'high')
+
+BBOX_KEYS = ['min_latitude', 'min_longitude', 'max_latitude', 'max_longitude']
+
+def workout_calories(stats, user_gender, weight_kg, height_cm, age):
+    '''
+    Calorie estimate for analysed stats and a body profile, or None without a weight.
+    The MET value follows the heart-rate intensity; when the samples are at hand,
+    metrics.with_sample_metrics replaces it with the heart-rate calories.
+    '''
+    if weight_kg is None:
+        return None
+    intensity = heart_rate_intensity(age, stats['avg_heart_rate'])
+    return estimate_total_calories_burned(user_gender, weight_kg, height_cm, age, intensity, stats['workout_duration'])
+
 def analyze_workout_data(workout_data, user_gender, weight_kg, height_cm, age):
-    if not workout_data:
+    '''
+    Summarises the samples of one workout. The body profile only feeds the calorie
+    estimate; with weight_kg=None it is skipped (see workout_calories).
+    '''
+    if len(workout_data) == 0:
         raise ValueError("No workout data available")  # Ensure workout_data is not empty
 
-    # Create DataFrame from workout_data
-    try:
-        df = pd.DataFrame(workout_data)
-    except ValueError:
-        raise ValueError("Workout data is improperly formatted, expected a list of dictionaries.")
+    # Create DataFrame from workout_data (samples from read_samples are used as-is)
+    if isinstance(workout_data, pd.DataFrame):
+        df = workout_data.copy(deep=False)
+    else:
+        try:
+            df = pd.DataFrame(workout_data)
+        except ValueError:
+            raise ValueError("Workout data is improperly formatted, expected a list of dictionaries.")
 
     # Calculate total distance and other stats
     if 'distance' in df and not df['distance'].empty:
         total_distance = float(df['distance'].max())
     else:
         total_distance = 0.0
+
+    # Many exports have GPS fixes but no distance column: measure the track instead
+    track = track_arrays(df)
+    if track is not None and pd.isna(total_distance):
+        total_distance = float(cumulative_distance(*track)[-1])
+    bbox = bounding_box(*track) if track is not None else (None, None, None, None)
     df['date'] = pd.to_datetime(df['date'])
     workout_duration = (df.loc[len(df) - 1, 'date'] - df.loc[0, 'date']).total_seconds() / 60
 
     # Average heart rate from the 'heart_rate' field
     avg_heart_rate = df['heart_rate'].mean() if 'heart_rate' in df else None
 
-    # Average cadence and calories
+    # Average cadence and power
     avg_cadence = df['cadence'].mean() if 'cadence' in df else None
     avg_power = df['power'].mean() if 'power' in df else None
-    total_calories = estimate_total_calories_burned(user_gender, weight_kg, height_cm, age, avg_heart_rate, workout_duration)
 
    # Elevation and Elevation Gain
     avg_elevation = df['elevation'].mean() if 'elevation' in df else None
@@ -95,42 +124,125 @@ def analyze_workout_data(workout_data, user_gender, weight_kg, height_cm, age):
         'avg_power': avg_power,
         'avg_elevation': avg_elevation,
         'elevation_gain': elevation_gain,
-        'total_calories': total_calories
+        **dict(zip(BBOX_KEYS, bbox)),
     }
+    stats['total_calories'] = workout_calories(stats, user_gender, weight_kg, height_cm, age)
 
     return stats
 
-def format_stats_for_ai(stats, user_gender, age, weight_kg, height_cm, fitness_goal, workout_type, fitness_level, workout_preference, has_injury, weekly_availability, time_per_session, target_focus):
-    """
-    Formats workout stats into a natural language summary for input to an AI model.
-    """
-    summary = (
-        f"User profile: {fitness_level.lower()} level, goal is to {fitness_goal.lower()} with a focus on {target_focus.lower()}. "
-        f"Prefers {workout_preference.lower()} workouts, available {weekly_availability} days/week for {time_per_session} minutes per session. "
-    )
-    summary += f"Your goal is to {fitness_goal.lower()}. This was a {workout_type.lower()} workout. "
-    summary += (
-        f"You are a {user_gender} and you are {age} years old."
-        f"You weigh {weight_kg} kg and are {height_cm} m tall."
-        f"In the last workout, you covered {stats['total_distance']:.2f} m "
-        f"in {stats['workout_duration']} minutes. "
-    )
-    if stats['avg_heart_rate'] is not None:
-        summary += f"Your average heart rate was {stats['avg_heart_rate']:.0f} bpm. "
-    if stats['avg_cadence'] is not None:
-        summary += f"Your average cadence was {stats['avg_cadence']:.0f} steps/min. "
-    if stats['avg_power'] is not None:
-        summary += f"Your average power output was {stats['avg_power']:.0f} watts. "
-    if stats['total_calories'] is not None:
-        summary += f"You burned around {stats['total_calories']} kcal. "
-    if stats['avg_elevation'] is not None:
-        summary += f"You worked out at {stats['avg_elevation']:.0f}. "
-    if stats['elevation_gain'] is not None:
-        summary += f"During your workout, your elevation gain was {stats['elevation_gain']:.2f} m."
-    if has_injury:
-        summary += f"Note: the user has the following injury or limitation: {has_injury}. "
-    summary += "Based on this performance and training history, suggest the next workout."
-    return summary
+def analyze_workout_stream(file_path, user_gender, weight_kg, height_cm, age, chunksize=None, parse_info=None):
+    '''
+    Streaming version of analyze_workout_data for very long workouts.
+    Reads the file in fixed-size chunks and keeps only running aggregates,
+    so peak memory does not depend on the length of the file.
+    '''
+    if chunksize is None:
+        chunks = iter_workout_chunks(file_path, parse_info=parse_info)
+    else:
+        chunks = iter_workout_chunks(file_path, chunksize, parse_info)
+
+    max_distance = None
+    first_date = last_date = None
+    sums = {'heart_rate': 0.0, 'cadence': 0.0, 'power': 0.0, 'elevation': 0.0}
+    counts = dict.fromkeys(sums, 0)
+    min_elevation = max_elevation = None
+    track_distance = 0.0
+    last_fix = None  # Last GPS fix of the previous chunk, so segments across chunk borders count
+    bbox = None
+    rows = 0
+
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        if rows == 0:
+            first_date = chunk['date'].iloc[0]
+        last_date = chunk['date'].iloc[-1]
+        rows += len(chunk)
+
+        chunk_distance = pd.to_numeric(chunk['distance'], errors='coerce').max()
+        if pd.notna(chunk_distance):
+            max_distance = chunk_distance if max_distance is None else max(max_distance, chunk_distance)
+
+        for col in sums:
+            values = pd.to_numeric(chunk[col], errors='coerce')
+            sums[col] += values.sum()
+            counts[col] += int(values.count())
+            if col == 'elevation' and counts[col]:
+                low, high = values.min(), values.max()
+                if pd.notna(low):
+                    min_elevation = low if min_elevation is None else min(min_elevation, low)
+                    max_elevation = high if max_elevation is None else max(max_elevation, high)
+
+        track = track_arrays(chunk)
+        if track is not None:
+            lat, lon = track
+            if last_fix is not None:
+                lat, lon = np.append(last_fix[0], lat), np.append(last_fix[1], lon)
+            track_distance += segment_distances(lat, lon).sum()
+            valid = np.flatnonzero(~np.isnan(lat))
+            last_fix = (lat[valid[-1]], lon[valid[-1]])
+            chunk_bbox = bounding_box(lat, lon)
+            bbox = chunk_bbox if bbox is None else (
+                min(bbox[0], chunk_bbox[0]), min(bbox[1], chunk_bbox[1]),
+                max(bbox[2], chunk_bbox[2]), max(bbox[3], chunk_bbox[3]))
+
+    if rows == 0:
+        raise ValueError("No workout data available")
+
+    total_distance = float(max_distance) if max_distance is not None else np.nan
+    if last_fix is not None and pd.isna(total_distance):
+        total_distance = float(track_distance)
+    workout_duration = (pd.to_datetime(last_date) - pd.to_datetime(first_date)).total_seconds() / 60
+    means = {col: (sums[col] / counts[col] if counts[col] else np.nan) for col in sums}
+    if min_elevation is not None:
+        elevation_gain = max_elevation - min_elevation
+    else:
+        elevation_gain = np.nan
+
+    stats = {
+        'total_distance': total_distance,
+        'workout_duration': workout_duration,
+        'avg_heart_rate': means['heart_rate'],
+        'avg_cadence': means['cadence'],
+        'avg_power': means['power'],
+        'avg_elevation': means['elevation'],
+        'elevation_gain': elevation_gain,
+        **dict(zip(BBOX_KEYS, bbox or (None, None, None, None))),
+    }
+    stats['total_calories'] = workout_calories(stats, user_gender, weight_kg, height_cm, age)
+
+    return stats
+
+def infer_workout_type(file_name):
+    '''
+    Infers the workout type from a HealthFit export file name, or returns None.
+    '''
+    file_name = file_name.lower()
+    if "outdoor" in file_name and "run" in file_name:
+        return "Outdoor Run"
+    elif "outdoor" in file_name and "walk" in file_name:
+        return "Outdoor Walk"
+    elif "functional" in file_name and "strength" in file_name:
+        return "Functional Strength Training"
+    elif "indoor" in file_name and "run" in file_name:
+        return "Indoor Running"
+    elif "indoor" in file_name and "cycling" in file_name:
+        return "Indoor Cycling"
+    elif "indoor" in file_name and "walk" in file_name:
+        return "Indoor Walk"
+    elif "traditional" in file_name and "strength" in file_name:
+        return "Traditional Strength Training"
+    elif "outdoor" in file_name and "cycling" in file_name:
+        return "Outdoor Cycling"
+    elif "hiking" in file_name or "trekking" in file_name:
+        return "Hiking"
+    elif "swimming" in file_name:
+        return "Swimming"
+    elif "yoga" in file_name:
+        return "Yoga"
+    elif "tennis" in file_name:
+        return "Tennis"
+    return None
 
 def extract_text_after_tag(text, tag):
     '''
@@ -142,56 +254,3 @@ def extract_text_after_tag(text, tag):
         return text[match.end():].strip()
     else:
         return ""  # or return None, depending on your needs
-    
-'''
-def display_workout_data(uploaded_file):
-    if uploaded_file is not None:
-        # Save the uploaded file to a temporary location
-        temp_file_path = os.path.join("temp", uploaded_file.name)
-        with open(temp_file_path, "wb") as f:
-            f.write(uploaded_file.getbuffer())
-
-        # Parse the workout data from CSV
-        workout_data = parse_csv_file(temp_file_path)
-
-        user_gender = st.selectbox("Select your gender", options=["male", "female"])
-        weight_kg = st.number_input("Enter your weight (kg)", min_value=0.0, format="%.2f")
-        height_cm = st.number_input("Enter your height (cm)", min_value=0.0, format="%.2f")
-        age = st.number_input("Enter your age", min_value=0, format="%d")
-
-        # Analyze the workout data
-        stats = analyze_workout_data(workout_data, user_gender, weight_kg, height_cm, age)
-        
-        # Display the workout summary
-        st.write("📊 Workout Summary")
-        st.write(f"**Total Distance:** {stats['total_distance']:.2f} m")
-        st.write(f"**Workout Duration:** {stats['workout_duration']} minutes")
-        st.write(f"**Average Heart Rate:** {stats['avg_heart_rate'] if stats['avg_heart_rate'] is not None else 'N/A'} bpm")
-        st.write(f"**Average Cadence:** {stats['avg_cadence'] if stats['avg_cadence'] is not None else 'N/A':.2f} steps/min")
-        st.write(f"**Average Elevation:** {stats['avg_elevation'] if stats['avg_elevation'] is not None else 'N/A':.2f} m")
-        st.write(f"**Average Power:** {stats['avg_power'] if stats['avg_power'] is not None else 'N/A':.2f} watts")
-        st.write(f"**Elevation Gain:** {stats['elevation_gain'] if stats['elevation_gain'] is not None else 'N/A'} m")
-        st.write(f"**Total Calories Burned:** {stats['total_calories'] if stats['total_calories'] is not None else 'N/A'} kcal")
-
-        # Ask the AI for workout suggestions based on the stats
-        prompt = format_stats_for_ai(stats)
-        st.write("🧠 Asking AI for the next workout suggestion...")
-        suggestion = ask_local_llm(prompt)
-        st.write(f"**Suggested Workout:** {suggestion}")
-
-        # Log the workout data into the SQLite database
-        log_workout(temp_file_path, stats)
-    else:
-        st.warning("Please upload a CSV file to analyze your workout data.")
-'''
-def main():
-    st.title("AI Fitness Coach - Workout Analyzer")
-
-    # File upload widget
-    uploaded_file = st.file_uploader("Upload your workout CSV file", type=["csv"])
-
-    # Display workout data and stats
-    display_workout_data(uploaded_file)
-
-if __name__ == "__main__":
-    main()
\ No newline at end of file
@@ -0,0 +1,109 @@
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+METRICS_PATH = os.path.join('data', 'metrics.jsonl')
+MAX_METRICS_BYTES = 10 * 1024 * 1024  # The sink is rotated to metrics.jsonl.1 past this size
+MAX_SPANS_READ = 20000  # Only the tail of the sink is read back for the timing panel
+
+# Where spans are appended; None turns the sink off
+metrics_path = METRICS_PATH
+
+_current_run = ContextVar('timing_run', default=None)
+_write_lock = threading.Lock()
+
+
+def set_metrics_path(path):
+    '''
+    Points the sink at another JSONL file, or switches it off with None.
+    '''
+    global metrics_path
+    metrics_path = path
+
+def _write(record):
+    if metrics_path is None:
+        return
+    line = json.dumps(record, separators=(',', ':')) + '\n'
+    with _write_lock:
+        os.makedirs(os.path.dirname(metrics_path) or '.', exist_ok=True)
+        with open(metrics_path, 'a', encoding='utf-8') as f:
+            f.write(line)
+            size = f.tell()
+        if size > MAX_METRICS_BYTES:
+            os.replace(metrics_path, metrics_path + '.1')
+
+@contextmanager
+def span(stage, rows=None, **fields):
+    '''
+    Times the block and appends one record to the metrics sink:
+    run, stage, start, seconds, rows, tokens and any extra `fields`.
+    The record is yielded, so the block can fill in counts it only knows at the
+    end (record['tokens'] = ...). A failing block is recorded with its error.
+    '''
+    record = {'run': _current_run.get(), 'stage': stage, 'start': time.time(), 'seconds': None,
+              'rows': rows, 'tokens': None, **fields}
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record['error'] = type(e).__name__
+        raise
+    finally:
+        record['seconds'] = time.perf_counter() - start
+        _write(record)
+
+@contextmanager
+def timed_run(stage, **fields):
+    '''
+    Starts a new run: every span opened inside the block (and in threads started
+    with a copy of this context) is tagged with the same run id. The whole block
+    is recorded as a span of its own under `stage`.
+    '''
+    token = _current_run.set(uuid.uuid4().hex[:12])
+    try:
+        with span(stage, **fields) as record:
+            yield record
+    finally:
+        _current_run.reset(token)
+
+def read_spans(last_runs=20, path=None):
+    '''
+    Returns the spans of the last `last_runs` runs as a DataFrame, oldest first.
+    Spans recorded outside a run are left out.
+    '''
+    import pandas as pd  # Only the timing panel reads the sink back
+
+    path = path or metrics_path
+    if path is None or not os.path.exists(path):
+        return pd.DataFrame(columns=['run', 'stage', 'start', 'seconds', 'rows', 'tokens'])
+    with open(path, encoding='utf-8') as f:
+        lines = deque(f, maxlen=MAX_SPANS_READ)
+
+    records = []
+    for line in lines:
+        try:
+            records.append(json.loads(line))
+        except json.JSONDecodeError:
+            continue  # A line cut short by a crash or a concurrent rotation
+    spans = pd.DataFrame(records, columns=['run', 'stage', 'start', 'seconds', 'rows', 'tokens'])
+    spans = spans[spans['run'].notna()]
+    runs = spans.groupby('run')['start'].min().nlargest(last_runs).index
+    return spans[spans['run'].isin(runs)].sort_values('start', ignore_index=True)
+
+def stage_summary(spans):
+    '''
+    Per-stage count, p50 and p95 latency (ms), and mean rows and tokens of read_spans() output.
+    '''
+    summary = spans.groupby('stage', sort=False).agg(
+        count=('seconds', 'size'),
+        p50_ms=('seconds', lambda s: s.quantile(0.5) * 1000),
+        p95_ms=('seconds', lambda s: s.quantile(0.95) * 1000),
+        rows=('rows', 'mean'),
+        tokens=('tokens', 'mean'),
+    )
+    return summary.sort_values('p95_ms', ascending=False)
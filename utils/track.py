@@ -0,0 +1,142 @@
+import heapq
+import numpy as np
+import pandas as pd
+
+EARTH_RADIUS_M = 6371008.8
+SIMPLIFY_TOLERANCE_M = 5.0  # Max distance between the original and the simplified track
+MAX_TRACK_POINTS = 2000     # Fixes kept per track, however long or noisy the recording
+SIMPLIFY_BLOCK = 1000       # Fixes per initial span, which bounds the work of every split
+
+
+def track_arrays(samples):
+    '''
+    Returns (latitude, longitude) float arrays for the samples, or None without a GPS track.
+    Samples without a fix are NaN in both arrays.
+    '''
+    if 'latitude' not in samples or 'longitude' not in samples:
+        return None
+    lat = pd.to_numeric(samples['latitude'], errors='coerce').to_numpy(dtype=float)
+    lon = pd.to_numeric(samples['longitude'], errors='coerce').to_numpy(dtype=float)
+    missing = np.isnan(lat) | np.isnan(lon) | ((lat == 0) & (lon == 0))  # 0,0 is "no fix" on some devices
+    if missing.all():
+        return None
+    return np.where(missing, np.nan, lat), np.where(missing, np.nan, lon)
+
+def haversine(lat1, lon1, lat2, lon2):
+    '''
+    Great-circle distance in metres between coordinate arrays (degrees), element-wise.
+    '''
+    lat1, lon1, lat2, lon2 = map(np.radians, (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0.0, 1.0)))
+
+def segment_distances(lat, lon):
+    '''
+    Metres between consecutive fixes (length n - 1). Segments touching a sample
+    without a fix bridge to the next fix, so GPS dropouts do not lose distance.
+    '''
+    valid = ~np.isnan(lat)
+    segments = np.zeros(max(len(lat) - 1, 0))
+    idx = np.flatnonzero(valid)
+    if len(idx) > 1:
+        # Credit each bridged gap to the segment that ends at the next fix
+        segments[idx[1:] - 1] = haversine(lat[idx[:-1]], lon[idx[:-1]], lat[idx[1:]], lon[idx[1:]])
+    return segments
+
+def cumulative_distance(lat, lon):
+    '''
+    Distance in metres from the start to every sample, like a device `distance` column.
+    '''
+    return np.concatenate(([0.0], np.cumsum(segment_distances(lat, lon))))
+
+def segment_speeds(lat, lon, t):
+    '''
+    Speed in m/s over each segment, given elapsed seconds `t`; NaN where no time passed.
+    '''
+    dt = np.diff(t)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(dt > 0, segment_distances(lat, lon) / dt, np.nan)
+
+def bounding_box(lat, lon):
+    '''
+    Returns (min_latitude, min_longitude, max_latitude, max_longitude) of the fixes.
+    '''
+    return float(np.nanmin(lat)), float(np.nanmin(lon)), float(np.nanmax(lat)), float(np.nanmax(lon))
+
+def _project(lat, lon):
+    # Local equirectangular projection in metres, accurate enough at track scale
+    lat0 = np.radians(np.mean(lat))
+    x = np.radians(lon) * EARTH_RADIUS_M * np.cos(lat0)
+    y = np.radians(lat) * EARTH_RADIUS_M
+    return x, y
+
+def _farthest(x, y, start, end):
+    # Distance of every inner point to the segment start-end (a point for closed loops)
+    px, py = x[start + 1:end] - x[start], y[start + 1:end] - y[start]
+    sx, sy = x[end] - x[start], y[end] - y[start]
+    length2 = sx * sx + sy * sy
+    t = np.clip((px * sx + py * sy) / length2, 0.0, 1.0) if length2 > 0 else 0.0
+    distances = np.hypot(px - t * sx, py - t * sy)
+    farthest = int(np.argmax(distances))
+    return distances[farthest], start + 1 + farthest
+
+def simplify_track(lat, lon, tolerance_m=SIMPLIFY_TOLERANCE_M, max_points=MAX_TRACK_POINTS):
+    '''
+    Douglas-Peucker simplification. Returns the indices of the fixes to keep, so
+    that no dropped fix is further than `tolerance_m` from the simplified line.
+    The track starts as spans of at most SIMPLIFY_BLOCK fixes, the span with the
+    farthest fix is split first and splitting stops at `max_points` fixes, so a long
+    or noisy track costs O(n + max_points * SIMPLIFY_BLOCK) and keeps its largest features.
+    '''
+    idx = np.flatnonzero(~np.isnan(lat))
+    if len(idx) < 3:
+        return idx
+    x, y = _project(lat[idx], lon[idx])
+    # Block ends are kept; never let them use more than half of `max_points`
+    block = max(SIMPLIFY_BLOCK, -(-2 * len(idx) // max(max_points, 2)))
+    bounds = np.unique(np.append(np.arange(0, len(idx), block), len(idx) - 1))
+    keep = np.zeros(len(idx), dtype=bool)
+    keep[bounds] = True
+
+    spans = []  # Heap of (-distance, start, end, farthest fix) for spans that need splitting
+
+    def push(start, end):
+        if end - start >= 2:
+            distance, split = _farthest(x, y, start, end)
+            if distance > tolerance_m:
+                heapq.heappush(spans, (-distance, start, end, split))
+
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        push(start, end)
+    kept = len(bounds)
+    while spans and kept < max_points:
+        _, start, end, split = heapq.heappop(spans)
+        keep[split] = True
+        kept += 1
+        push(start, split)
+        push(split, end)
+    return idx[keep]
+
+def encode_track(lat, lon):
+    '''
+    Packs a (simplified) track into bytes for the workout_tracks table.
+    '''
+    return np.column_stack((lat, lon)).astype('<f8').tobytes()
+
+def decode_track(blob):
+    '''
+    Unpacks encode_track() bytes into a DataFrame with latitude and longitude columns.
+    '''
+    points = np.frombuffer(blob, dtype='<f8').reshape(-1, 2)
+    return pd.DataFrame(points, columns=['latitude', 'longitude'])
+
+def track_blob(samples, tolerance_m=SIMPLIFY_TOLERANCE_M):
+    '''
+    Simplifies the samples' GPS track and packs it for storage, or returns None without a track.
+    '''
+    track = track_arrays(samples)
+    if track is None:
+        return None
+    lat, lon = track
+    keep = simplify_track(lat, lon, tolerance_m)
+    return encode_track(lat[keep], lon[keep])
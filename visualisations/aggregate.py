@@ -0,0 +1,62 @@
+import numpy as np
+
+MONTH_NAMES = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
+               'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
+WEEKDAY_NAMES = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+
+
+def aggregate_history(daily):
+    """
+    Builds every history chart input in one pass over the daily rollup.
+    Dates are converted once to integer day, ISO-week, weekday and year-month
+    codes, and each matrix or series is a single np.bincount over those codes.
+    Returns a dict with:
+      weekday_matrix  (7, n_weeks)  workouts per weekday and ISO week with workouts
+      week_labels     n_weeks labels (week number, or YYYY-Www across several years)
+      calendar_matrix (31, n_months) workouts per day of month and calendar month
+      monthly_volume  (n_months,)   workouts per calendar month
+      month_labels    n_months labels, Jan of the first year to Dec of the last
+    """
+    days = np.asarray(daily['bucket'].to_numpy(dtype=str), dtype='datetime64[D]')
+    counts = daily['workouts'].to_numpy(dtype=np.int64)
+    day_codes = days.astype(np.int64)  # Days since 1970-01-01 (a Thursday)
+
+    # ISO week: the week belongs to the year of its Thursday
+    weekday = (day_codes - 4) % 7  # Monday = 0
+    thursday = day_codes - weekday + 3
+    iso_year = thursday.astype('datetime64[D]').astype('datetime64[Y]').astype(np.int64) + 1970
+    jan_first = (iso_year - 1970).astype('datetime64[Y]').astype('datetime64[D]').astype(np.int64)
+    iso_week = (thursday - jan_first) // 7 + 1
+    week_codes, week_index = np.unique(iso_year * 100 + iso_week, return_inverse=True)
+    n_weeks = len(week_codes)
+    weekday_matrix = np.bincount(weekday * n_weeks + week_index, weights=counts,
+                                 minlength=7 * n_weeks).reshape(7, n_weeks)
+
+    # Calendar months, padded to whole years so every year shows Jan..Dec
+    month_codes = days.astype('datetime64[M]').astype(np.int64)  # Months since 1970-01
+    first_month = month_codes.min() - month_codes.min() % 12
+    n_months = month_codes.max() - month_codes.max() % 12 + 12 - first_month
+    month_index = month_codes - first_month
+    day_of_month = day_codes - month_codes.astype('datetime64[M]').astype('datetime64[D]').astype(np.int64)
+    calendar_matrix = np.bincount(day_of_month * n_months + month_index, weights=counts,
+                                  minlength=31 * n_months).reshape(31, n_months)
+    monthly_volume = np.bincount(month_index, weights=counts, minlength=n_months)
+
+    multi_year = n_months > 12
+    years = week_codes // 100
+    if len(np.unique(years)) > 1:
+        week_labels = [f"{code // 100}-W{code % 100:02d}" for code in week_codes]
+    else:
+        week_labels = [str(code % 100) for code in week_codes]
+    month_labels = [
+        f"{MONTH_NAMES[m % 12]} {(1970 + m // 12) % 100:02d}" if multi_year else MONTH_NAMES[m % 12]
+        for m in range(first_month, first_month + n_months)
+    ]
+
+    return {
+        'weekday_matrix': weekday_matrix.astype(np.int64),
+        'week_labels': week_labels,
+        'calendar_matrix': calendar_matrix.astype(np.int64),
+        'monthly_volume': monthly_volume.astype(np.int64),
+        'month_labels': month_labels,
+    }
@@ -1,53 +1,38 @@
-import pandas as pd
 import seaborn as sns
-import matplotlib.pyplot as plt
 import streamlit as st
+from visualisations.aggregate import WEEKDAY_NAMES
+from visualisations.render import show_chart
 
-def plot_workout_by_weekday_heatmap(df):
+def plot_workout_by_weekday_heatmap(weekday_matrix, week_labels, version=None):
     """
     Displays a heatmap of workout counts by day of week and week number.
-    Assumes df has a 'date' column in datetime format or convertible string format.
+    Takes the weekday_matrix and week_labels built by aggregate_history.
+    Pass the workout log version to reuse the rendered image until the log changes.
     """
-    df['date'] = pd.to_datetime(df['date'])
-    df['count'] = 1  # count 1 workout per day
+    def draw(ax):
+        if weekday_matrix.size == 0:
+            return False
 
-    heatmap_data = df.groupby(df['date'].dt.date).agg({'count': 'sum'}).reset_index()
-    heatmap_data['date'] = pd.to_datetime(heatmap_data['date'])
-    heatmap_data['dow'] = heatmap_data['date'].dt.day_name()
-    heatmap_data['week'] = heatmap_data['date'].dt.isocalendar().week
+        sns.heatmap(weekday_matrix, cmap="YlGnBu", linewidths=.5, annot=True, fmt="d", cbar=False,
+                    xticklabels=week_labels, yticklabels=WEEKDAY_NAMES, ax=ax)
+        ax.set_title("Workout Frequency by Weekday and Week Number")
+        ax.set_xlabel("Week Number")
+        ax.set_ylabel("Day of Week")
 
-    pivot_table = heatmap_data.pivot_table(index='dow', columns='week', values='count', fill_value=0)
-    ordered_days = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
-    pivot_table = pivot_table.reindex(ordered_days)
-
-    if pivot_table.empty:
+    if not show_chart('weekday_heatmap', version, draw, figsize=(12, 4), rows=weekday_matrix.size):
         st.warning("Not enough data to generate weekday heatmap.")
-        return
-
-    plt.figure(figsize=(12, 4))
-    sns.heatmap(pivot_table, cmap="YlGnBu", linewidths=.5, annot=True, fmt=".0f", cbar=False)
-    plt.title("Workout Frequency by Weekday and Week Number")
-    plt.xlabel("Week Number")
-    plt.ylabel("Day of Week")
-    st.pyplot(plt)
 
-def plot_calendar_month_heatmap(df):
+def plot_calendar_month_heatmap(calendar_matrix, month_labels, version=None):
     """
     Displays a heatmap calendar of workouts by day of month and month.
+    Takes the calendar_matrix and month_labels built by aggregate_history; each
+    year of history gets its own twelve columns.
     """
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.strftime('%b')
-    df['day'] = df['date'].dt.day
-    df['count'] = 1
-
-    pivot_table = df.pivot_table(index='day', columns='month', values='count', aggfunc='sum', fill_value=0)
-    months_order = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-                    'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    pivot_table = pivot_table.reindex(columns=months_order, fill_value=0)
-
-    plt.figure(figsize=(12, 6))
-    sns.heatmap(pivot_table, cmap="YlOrBr", linewidths=.5, annot=True, fmt=".0f", cbar=False)
-    plt.title("Workout Frequency Calendar (Day x Month)")
-    plt.xlabel("Month")
-    plt.ylabel("Day of Month")
-    st.pyplot(plt)
\ No newline at end of file
+    def draw(ax):
+        sns.heatmap(calendar_matrix, cmap="YlOrBr", linewidths=.5, annot=len(month_labels) <= 24, fmt="d", cbar=False,
+                    xticklabels=month_labels, yticklabels=range(1, 32), ax=ax)
+        ax.set_title("Workout Frequency Calendar (Day x Month)")
+        ax.set_xlabel("Month")
+        ax.set_ylabel("Day of Month")
+
+    show_chart('calendar_month_heatmap', version, draw, figsize=(12, 6), rows=calendar_matrix.size)
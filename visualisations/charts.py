@@ -1,36 +1,37 @@
-import pandas as pd
 import seaborn as sns
-import matplotlib.pyplot as plt
 import streamlit as st
+from visualisations.render import show_chart
 
-def plot_monthly_workout_volume(df):
-    df['date'] = pd.to_datetime(df['date'])
-    df['month'] = df['date'].dt.strftime('%b')
-    monthly_counts = df.groupby('month').size().reindex([
-        'Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun',
-        'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec'
-    ])
+def plot_monthly_workout_volume(monthly_volume, month_labels, version=None):
+    """
+    Takes the monthly_volume series and month_labels built by aggregate_history.
+    """
+    def draw(ax):
+        sns.barplot(x=month_labels, y=monthly_volume, hue=month_labels,
+                    palette="viridis", legend=False, ax=ax)
+        ax.set_title("Total Workouts per Month")
+        ax.set_xlabel("Month")
+        ax.set_ylabel("Number of Workouts")
+        if len(month_labels) > 12:
+            ax.tick_params(axis='x', labelrotation=90)
 
-    plt.figure(figsize=(10, 4))
-    sns.barplot(x=monthly_counts.index, y=monthly_counts.values, palette="viridis")
-    plt.title("Total Workouts per Month")
-    plt.xlabel("Month")
-    plt.ylabel("Number of Workouts")
-    st.pyplot(plt)
+    show_chart('monthly_workout_volume', version, draw, figsize=(10, 4), rows=len(monthly_volume))
 
-def plot_workout_type_distribution(df, workout_type=None):
-    if 'workout_type' not in df.columns:
-        st.warning("No 'workout_type' column found in workout log.")
+def plot_workout_type_distribution(type_counts, workout_type=None, version=None):
+    """
+    Expects a Series of session counts indexed by workout type, as returned by fetch_workout_type_counts.
+    """
+    if type_counts.empty:
+        st.warning("No workout types found in workout log.")
         return
-    
-    type_counts = df['workout_type'].value_counts()
 
-    plt.figure(figsize=(8, 6))
-    type_counts.plot(kind='barh', color='skyblue')
-    plt.title("Workout Type Distribution")
-    plt.xlabel("Number of Sessions")
-    plt.ylabel("Workout Type")
-    st.pyplot(plt)
+    def draw(ax):
+        type_counts.plot(kind='barh', color='skyblue', ax=ax)
+        ax.set_title("Workout Type Distribution")
+        ax.set_xlabel("Number of Sessions")
+        ax.set_ylabel("Workout Type")
+
+    show_chart('workout_type_distribution', version, draw, figsize=(8, 6), rows=len(type_counts))
 
     if workout_type and workout_type in type_counts:
-        st.markdown(f"🔍 **Current workout type:** {workout_type} — {type_counts[workout_type]} sessions")
\ No newline at end of file
+        st.markdown(f"🔍 **Current workout type:** {workout_type} — {type_counts[workout_type]} sessions")
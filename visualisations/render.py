@@ -0,0 +1,60 @@
+import io
+import threading
+from collections import OrderedDict
+from matplotlib.figure import Figure
+import streamlit as st
+from utils.timing import span
+
+MAX_CACHED_CHARTS = 32  # Rendered images kept in memory, least recently used evicted first
+
+_chart_cache = OrderedDict()
+_chart_cache_lock = threading.Lock()
+
+
+def render_chart(name, version, draw, figsize, fmt='png', dpi=100):
+    """
+    Returns the rendered image bytes for chart `name` at data `version`.
+    `draw(ax)` is only called on a cache miss; it returns False when there is
+    nothing to plot, in which case None is returned (and cached). The figure is
+    built outside pyplot and released right after rendering, so reruns never
+    accumulate open figures. A `version` of None disables caching.
+    """
+    key = (name, version, fmt)
+    if version is not None:
+        with _chart_cache_lock:
+            if key in _chart_cache:
+                _chart_cache.move_to_end(key)
+                return _chart_cache[key]
+
+    fig = Figure(figsize=figsize)  # Not registered with pyplot, nothing to leak
+    try:
+        ax = fig.add_subplot()
+        if draw(ax) is False:
+            image = None
+        else:
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format=fmt, dpi=dpi, bbox_inches='tight')
+            image = buffer.getvalue()
+    finally:
+        fig.clear()
+
+    if version is not None:
+        with _chart_cache_lock:
+            _chart_cache[key] = image
+            while len(_chart_cache) > MAX_CACHED_CHARTS:
+                _chart_cache.popitem(last=False)
+    return image
+
+def show_chart(name, version, draw, figsize, rows=None):
+    """
+    Renders (or reuses) a chart and displays it. Returns False if there was nothing to plot.
+    `rows` is the number of data points drawn, recorded with the chart's timing span.
+    """
+    with span(f"plot.{name}", rows=rows) as record:
+        with _chart_cache_lock:
+            record['cached'] = (name, version, 'png') in _chart_cache
+        image = render_chart(name, version, draw, figsize)
+        if image is None:
+            return False
+        st.image(image, width="stretch")
+    return True